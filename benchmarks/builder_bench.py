@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+'''
+@author Luke Campbell <LCampbell@ASAScience.com>
+@file builder_bench
+@date 10/18/26 15:30
+@description Build cost and allocations of the dict query builders against plain dict literals of the same request
+
+The literals are the floor for any other node representation: whatever a query is built from,
+the codecs need these dicts (or have to be replaced by an encoder written in python) to send it.
+
+Usage:
+    python benchmarks/builder_bench.py [iterations]
+'''
+import sys
+import os
+import gc
+import timeit
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from elasticpy import ElasticQuery, ElasticFilter, ElasticSort
+from elasticpy.codec import available_codecs
+
+
+def builders():
+    return {
+        'query': ElasticQuery.bool(
+            must=[ElasticQuery.match('title', 'quick brown fox'), ElasticQuery.range('age', from_value=10, to_value=20)],
+            should=[ElasticQuery.term(tag='blue'), ElasticQuery.term(tag='pill')]),
+        'filter': ElasticFilter.and_filter([ElasticFilter.term('user', 'kimchy'), ElasticFilter.exists('location')]),
+        'sort': ElasticSort().sort('date', 'desc').sort('_score')
+    }
+
+
+def literals():
+    return {
+        'query': {'bool': {
+            'must': [{'match': {'title': {'query': 'quick brown fox'}}}, {'range': {'age': {'from': 10, 'to': 20}}}],
+            'should': [{'term': {'tag': 'blue'}}, {'term': {'tag': 'pill'}}]}},
+        'filter': {'and': [{'term': {'user': 'kimchy'}}, {'exists': {'field': 'location'}}]},
+        'sort': [{'date': {'order': 'desc'}}, {'_score': {'order': 'asc'}}]
+    }
+
+
+def allocations(func, count=1000):
+    '''
+    Objects tracked by the garbage collector per call, while the results are kept alive
+    '''
+    gc.collect()
+    gc.disable()
+    try:
+        before = len(gc.get_objects())
+        kept = [func() for i in xrange(count)]
+        after = len(gc.get_objects())
+    finally:
+        gc.enable()
+    return float(after - before - 1) / count
+
+
+def main(iterations=20000):
+    if builders() != literals():
+        raise SystemExit('The literals no longer match the builders: %r' % builders())
+    cases = [('builders', builders), ('literals', literals)]
+    print '%-9s %12s %14s' % ('', 'build (us)', 'objects/call')
+    for name, func in cases:
+        elapsed = min(timeit.repeat(func, number=iterations, repeat=3)) / iterations
+        print '%-9s %12.2f %14.1f' % (name, elapsed * 1e6, allocations(func))
+    print
+    print '%-12s %-9s %20s' % ('codec', '', 'build + encode (us)')
+    for codec in available_codecs():
+        for name, func in cases:
+            elapsed = min(timeit.repeat(lambda: codec.dumps(func()), number=iterations, repeat=3)) / iterations
+            print '%-12s %-9s %20.2f' % (codec.name, name, elapsed * 1e6)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+'''
+@author Luke Campbell <LCampbell@ASAScience.com>
+@file codec_bench
+@date 10/17/26 13:40
+@description Per request serialization cost of each available codec
+
+Usage:
+    python benchmarks/codec_bench.py [hits] [iterations]
+'''
+import sys
+import os
+import timeit
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from elasticpy import ElasticQuery, ElasticFilter
+from elasticpy.codec import available_codecs
+
+
+def search_header():
+    query = ElasticQuery.bool(
+        must=[ElasticQuery.match('title', 'quick brown fox'), ElasticQuery.range('age', from_value=10, to_value=20)],
+        should=[ElasticQuery.term(tag='blue'), ElasticQuery.term(tag='pill')])
+    return {
+        'query': query,
+        'filter': ElasticFilter.and_filter([ElasticFilter.term('user', 'kimchy'), ElasticFilter.exists('location')]),
+        'size': 50,
+        'sort': [{'date': {'order': 'desc'}}]
+    }
+
+
+def search_response(hits):
+    return {
+        'took': 12,
+        'timed_out': False,
+        '_shards': {'total': 5, 'successful': 5, 'failed': 0},
+        'hits': {
+            'total': hits,
+            'max_score': 1.0,
+            'hits': [{
+                '_index': 'twitter',
+                '_type': 'tweet',
+                '_id': str(i),
+                '_score': 1.0 / (i + 1),
+                '_source': {'user': 'kimchy', 'message': 'trying out elastic search ' * 4, 'tags': ['a', 'b', 'c'], 'retweets': i}
+            } for i in xrange(hits)]
+        }
+    }
+
+
+def main(hits=100, iterations=1000):
+    header = search_header()
+    response = search_response(hits)
+    print '%-12s %14s %14s' % ('codec', 'encode (us)', 'decode (us)')
+    for codec in available_codecs():
+        body = codec.dumps(response)
+        encode = min(timeit.repeat(lambda: codec.dumps(header), number=iterations, repeat=3)) / iterations
+        decode = min(timeit.repeat(lambda: codec.loads(body), number=iterations, repeat=3)) / iterations
+        print '%-12s %14.2f %14.2f' % (codec.name, encode * 1e6, decode * 1e6)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
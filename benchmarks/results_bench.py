@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+'''
+@author Luke Campbell <LCampbell@ASAScience.com>
+@file results_bench
+@date 10/17/26 20:40
+@description Decode cost of whole search responses against ElasticResults with lazy sources
+
+Usage:
+    python benchmarks/results_bench.py [hits] [iterations]
+'''
+import sys
+import os
+import gc
+import timeit
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from elasticpy import ElasticResults
+from elasticpy.codec import available_codecs, get_codec
+
+
+def response(hits, braces=False):
+    # Braces inside strings make ElasticResults tokenize the source instead of counting braces
+    document = {
+        'user': 'kimchy',
+        'date': '2009-11-15T14:12:12',
+        'message': 'trying out Elastic Search, so far so good? "quotes"' + (' {braces}' if braces else ''),
+        'tags': ['search', 'json', 'python'],
+        'location': {'lat': 40.73, 'lon': -74.1},
+        'comments': [{'author': 'user%d' % i, 'text': 'comment text ' * 8, 'votes': i} for i in xrange(5)]
+    }
+    return get_codec('json').dumps({
+        'took': 12, 'timed_out': False,
+        '_shards': {'total': 5, 'successful': 5, 'failed': 0},
+        'hits': {'total': 1000, 'max_score': 1.0, 'hits': [
+            {'_index': 'twitter', '_type': 'tweet', '_id': str(i), '_score': 1.0, '_source': document} for i in xrange(hits)]}
+    })
+
+
+def objects(func):
+    gc.collect()
+    before = len(gc.get_objects())
+    kept = func()
+    return len(gc.get_objects()) - before
+
+
+def main(hits=100, iterations=200):
+    for braces in (False, True):
+        text = response(hits, braces)
+        print '%d hits, %d bytes%s' % (hits, len(text), ', braces in strings' if braces else '')
+        run(text, iterations)
+        print
+
+
+def run(text, iterations):
+    print '%-12s %-18s %12s %10s' % ('codec', '', 'time (ms)', 'objects')
+    for codec in available_codecs():
+        cases = [
+            ('decode', lambda: codec.loads(text)),
+            ('lazy', lambda: ElasticResults(text, codec)),
+            ('lazy, read ids', lambda: [hit.id for hit in ElasticResults(text, codec)]),
+            ('lazy, read all', lambda: [hit.source for hit in ElasticResults(text, codec)])
+        ]
+        for name, func in cases:
+            elapsed = min(timeit.repeat(func, number=iterations, repeat=3)) / iterations
+            print '%-12s %-18s %12.3f %10d' % (codec.name, name, elapsed * 1e3, objects(func))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
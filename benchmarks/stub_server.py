@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+'''
+@author Luke Campbell <LCampbell@ASAScience.com>
+@file stub_server
+@date 10/17/26 21:40
+@description Local stand-in for an ElasticSearch node answering with canned responses
+
+Usage:
+    python benchmarks/stub_server.py [--port 9200] [--latency 0.005] [--hits 10] [--doc-size 200] [--indices 20]
+'''
+import sys
+import time
+import json
+import threading
+import argparse
+import BaseHTTPServer
+import SocketServer
+
+
+class ElasticStub(object):
+    '''
+    HTTP server answering _search, _msearch, _bulk, _cluster/state, _mapping and document requests with canned responses.
+    latency - seconds every response is delayed by
+    hits - hits in every search response
+    doc_size - approximate bytes of every hit's _source
+    indices - indices listed by _cluster/state
+
+    > stub = ElasticStub(latency=0.001, hits=50)
+    > port = stub.start()
+    > ElasticSearch(port=port).search_advanced('twitter', 'tweet', query)
+    > stub.stop()
+    '''
+
+    def __init__(self, latency=0.0, hits=10, doc_size=200, indices=20, host='127.0.0.1', port=0):
+        self.latency = latency
+        self.host = host
+        self.port = port
+        self.requests = 0
+        self.server = None
+        self.thread = None
+        document = {'user': 'kimchy', 'date': '2009-11-15T14:12:12', 'message': 'x' * max(doc_size - 60, 0)}
+        self.search = json.dumps({
+            'took': 3, 'timed_out': False,
+            '_shards': {'total': 5, 'successful': 5, 'failed': 0},
+            'hits': {'total': hits * 10, 'max_score': 1.0, 'hits': [
+                {'_index': 'twitter', '_type': 'tweet', '_id': str(i), '_score': 1.0, 'sort': [i], '_source': document} for i in xrange(hits)]}
+        })
+        self.state = json.dumps({
+            'cluster_name': 'elasticsearch',
+            'metadata': {'indices': dict(('index-%d' % i, {'state': 'open', 'settings': {}, 'mappings': {}}) for i in xrange(indices))}
+        })
+        self.mapping = json.dumps({'twitter': {'tweet': {'properties': {
+            'user': {'type': 'string', 'index': 'not_analyzed'},
+            'date': {'type': 'date'},
+            'message': {'type': 'string'}
+        }}}})
+        self.created = json.dumps({'ok': True, '_index': 'twitter', '_type': 'tweet', '_id': '1', '_version': 1})
+        self.ok = json.dumps({'ok': True, 'acknowledged': True})
+
+    def respond(self, method, path, body):
+        '''
+        Returns (status, body) for a request
+        '''
+        path = path.split('?', 1)[0].rstrip('/')
+        if path.endswith('/_search') or path.endswith('/_search/scroll'):
+            return 200, self.search
+        if path.endswith('/_msearch'):
+            count = body.count('\n') // 2
+            return 200, '{"responses":[%s]}' % ','.join([self.search] * count)
+        if path.endswith('/_bulk'):
+            count = body.count('\n') // 2
+            return 200, json.dumps({'took': 2, 'items': [{'index': {'_id': str(i), 'ok': True}} for i in xrange(count)]})
+        if path.endswith('/_cluster/state'):
+            return 200, self.state
+        if path.endswith('/_mapping') and method == 'GET':
+            return 200, self.mapping
+        if method == 'POST' and path.count('/') == 2:
+            return 200, self.created
+        return 200, self.ok
+
+    def start(self):
+        '''
+        Starts serving in a daemon thread, returns the port
+        '''
+        stub = self
+
+        class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Keep-alive responses written in one piece, otherwise Nagle and delayed acks add 40ms to every request
+            wbufsize = -1
+            disable_nagle_algorithm = True
+
+            def handle_request(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else ''
+                if stub.latency:
+                    time.sleep(stub.latency)
+                status, content = stub.respond(self.command, self.path, body)
+                stub.requests += 1
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=UTF-8')
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            do_GET = do_POST = do_PUT = do_DELETE = do_HEAD = handle_request
+
+            def log_message(self, *args):
+                pass
+
+        class Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+            daemon_threads = True
+            request_queue_size = 128
+
+        self.server = Server((self.host, self.port), Handler)
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self.port
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Local stand-in ElasticSearch node')
+    parser.add_argument('--port', type=int, default=9200)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--hits', type=int, default=10)
+    parser.add_argument('--doc-size', type=int, default=200)
+    parser.add_argument('--indices', type=int, default=20)
+    args = parser.parse_args(argv)
+    stub = ElasticStub(args.latency, args.hits, args.doc_size, args.indices, port=args.port)
+    print 'Listening on %s:%d' % (stub.host, stub.start())
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        stub.stop()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
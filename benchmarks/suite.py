@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+'''
+@author Luke Campbell <LCampbell@ASAScience.com>
+@file suite
+@date 10/17/26 21:40
+@description Throughput and latency of the client's hot paths against the local stub server
+
+Usage:
+    python benchmarks/suite.py [--iterations 2000] [--repeat 3] [--latency 0] [--hits 10] [--doc-size 200] [--only search_advanced,...]
+                               [--save baseline.json] [--compare baseline.json] [--tolerance 10]
+
+With --compare the exit status is 1 if any case is slower than the baseline by more than tolerance percent (ops/sec or p99).
+'''
+import sys
+import os
+import gc
+import time
+import json
+import platform
+import argparse
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from elasticpy import ElasticSearch, ElasticQuery, ElasticFilter, ElasticSort, ElasticFacet
+from stub_server import ElasticStub
+
+
+def build_query():
+    return {
+        'query': ElasticQuery.bool(
+            must=[ElasticQuery.match('title', 'quick brown fox'), ElasticQuery.range('age', from_value=10, to_value=20)],
+            should=[ElasticQuery.term(tag='blue'), ElasticQuery.term(tag='pill')]),
+        'filter': ElasticFilter.and_filter([ElasticFilter.term('user', 'kimchy'), ElasticFilter.exists('location')]),
+        'sort': ElasticSort().sort('date', 'desc').sort('_score'),
+        'facets': ElasticFacet().terms('tags', 'tags', size=5)
+    }
+
+
+def cases(port):
+    '''
+    Returns (name, setup) pairs, setup returns the function timed for one call
+    '''
+    def query_builders():
+        return build_query
+
+    def search_advanced():
+        search = ElasticSearch(port=port).size(10)
+        query = ElasticQuery.term(user='kimchy')
+        return lambda: search.search_advanced('twitter', 'tweet', query)
+
+    def doc_create():
+        search = ElasticSearch(port=port)
+        document = {'user': 'kimchy', 'date': '2009-11-15T14:12:12', 'message': 'trying out Elastic Search'}
+        return lambda: search.doc_create('twitter', 'tweet', document)
+
+    def index_list():
+        search = ElasticSearch(port=port)
+        return search.index_list
+
+    def type_list():
+        search = ElasticSearch(port=port)
+        return lambda: search.type_list('twitter')
+
+    return [
+        ('query_builders', query_builders),
+        ('search_advanced', search_advanced),
+        ('doc_create', doc_create),
+        ('index_list', index_list),
+        ('type_list', type_list)
+    ]
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * percent / 100.0), len(ordered) - 1)]
+
+
+def objects_per_call(func, count):
+    '''
+    gc tracked objects left alive per call while the results are kept, CPython 2 has no allocation counter
+    '''
+    gc.collect()
+    gc.disable()
+    try:
+        before = len(gc.get_objects())
+        kept = [func() for i in xrange(count)]
+        after = len(gc.get_objects())
+    finally:
+        gc.enable()
+    return float(after - before - 1) / count
+
+
+def measure(func, iterations, repeat):
+    '''
+    Times iterations calls repeat times and keeps the fastest round, like timeit, to leave out noise from the rest of the machine
+    '''
+    for i in xrange(min(iterations // 10 + 1, 200)):
+        func()
+    clock = time.time
+    best = None
+    for round in xrange(repeat):
+        latencies = list()
+        started = clock()
+        for i in xrange(iterations):
+            begin = clock()
+            func()
+            latencies.append(clock() - begin)
+        elapsed = clock() - started
+        if best is None or elapsed < best[0]:
+            best = (elapsed, latencies)
+    elapsed, latencies = best
+    return {
+        'ops': iterations / elapsed if elapsed else None,
+        'p50': percentile(latencies, 50),
+        'p99': percentile(latencies, 99),
+        'objects': objects_per_call(func, min(iterations, 500))
+    }
+
+
+def compare(results, baseline, tolerance):
+    '''
+    Prints the change against baseline, returns the names of the cases that regressed by more than tolerance percent
+    '''
+    regressions = list()
+    print
+    print '%-18s %12s %12s %12s' % ('vs baseline', 'ops/sec', 'p50', 'p99')
+    for name, result in results:
+        base = baseline.get('results', {}).get(name)
+        if not base:
+            print '%-18s %12s' % (name, 'new')
+            continue
+        ops = (result['ops'] / base['ops'] - 1) * 100 if base['ops'] else 0
+        p50 = (result['p50'] / base['p50'] - 1) * 100 if base['p50'] else 0
+        p99 = (result['p99'] / base['p99'] - 1) * 100 if base['p99'] else 0
+        regressed = ops < -tolerance or p99 > tolerance
+        print '%-18s %+11.1f%% %+11.1f%% %+11.1f%%%s' % (name, ops, p50, p99, '  REGRESSION' if regressed else '')
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='elasticpy benchmark suite')
+    parser.add_argument('--iterations', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=3, help='rounds of iterations, the fastest is kept')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds the stub server adds to every response')
+    parser.add_argument('--hits', type=int, default=10)
+    parser.add_argument('--doc-size', type=int, default=200)
+    parser.add_argument('--only', help='comma separated case names')
+    parser.add_argument('--save', help='write the results to this file')
+    parser.add_argument('--compare', help='compare with results saved by --save')
+    parser.add_argument('--tolerance', type=float, default=10.0, help='percent change flagged as a regression')
+    args = parser.parse_args(argv)
+
+    stub = ElasticStub(latency=args.latency, hits=args.hits, doc_size=args.doc_size)
+    port = stub.start()
+    selected = args.only.split(',') if args.only else None
+    results = list()
+    print '%-18s %12s %12s %12s %12s' % ('case', 'ops/sec', 'p50 (ms)', 'p99 (ms)', 'objects/call')
+    try:
+        for name, setup in cases(port):
+            if selected and name not in selected:
+                continue
+            result = measure(setup(), args.iterations, args.repeat)
+            results.append((name, result))
+            print '%-18s %12.0f %12.3f %12.3f %12.1f' % (name, result['ops'], result['p50'] * 1e3, result['p99'] * 1e3, result['objects'])
+    finally:
+        stub.stop()
+
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'settings': {'iterations': args.iterations, 'repeat': args.repeat, 'latency': args.latency, 'hits': args.hits, 'doc_size': args.doc_size},
+        'results': dict(results)
+    }
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get('settings') != report['settings']:
+            print 'Warning: the baseline was measured with different settings %s' % baseline.get('settings')
+        if compare(results, baseline, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -3,9 +3,25 @@ from map import ElasticMap
 from facet import ElasticFacet
 from filter import ElasticFilter
 from query import ElasticQuery
-from search import ElasticSearch
-from connection import ElasticConnection
+from search import ElasticSearch, ElasticScrollError
+from connection import ElasticConnection, ElasticSessionRegistry
 from sort import ElasticSort
+from bulk import ElasticBulk
+from reindex import ElasticReindex
+from loader import ElasticLoader
+from adaptive import ElasticAdaptiveBulk
+from cache import ElasticCache
+from tracker import ElasticFilterTracker
+from metrics import ElasticMetrics
+from slowlog import ElasticSlowLog
+from template import ElasticTemplate
+from pager import ElasticPager
+from results import ElasticResults, ElasticHit
+try:
+    from async_search import AsyncElasticSearch
+    from async_connection import AsyncElasticConnection
+except ImportError:
+    pass
 
 __version__ = '0.11'
 __author__  = 'Luke Campbell'
@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+'''
+@author Luke Campbell <LCampbell@ASAScience.com>
+@file adaptive
+@date 10/17/26 23:40
+@description Bulk indexing with batch size and concurrency adapted to the cluster's latency and rejections
+'''
+import time
+import Queue
+import threading
+from collections import deque
+
+from connection import ElasticConnection
+
+
+# Statuses of a whole _bulk request worth retrying, 0 is a connection error
+retry_statuses = (0, 429, 502, 503, 504)
+
+
+def rejected(result):
+    '''
+    True if a bulk item failed because the node's bulk queue was full, the item can be sent again as it is
+    '''
+    if result.get('status') in (429, 503):
+        return True
+    return 'EsRejectedExecutionException' in str(result.get('error', ''))
+
+
+class ElasticAdaptiveBulk(object):
+    '''
+    Sends encoded bulk actions (see bulk_action) with batch bytes and concurrency adjusted by AIMD after every response:
+    - an item rejected by a full bulk queue (429/503) halves both (decrease) and pauses sending for backoff seconds,
+      the rejected items are queued again and sent in the next batches, up to max_retries times each
+    - a response slower than target_latency seconds only shrinks the batches
+    - any other response grows the batches by step_bytes, and the concurrency by one every concurrency such responses
+    Responses to batches sent before the last decrease don't decrease again, so a burst of rejections counts once.
+    No more than concurrency batches are read from actions ahead of the responses.
+
+    > controller = ElasticAdaptiveBulk(max_threads=8, target_latency=0.5)
+    > controller.run(bulk_action('index', 'twitter', 'tweet', doc) for doc in documents)
+      {'indexed': 1000000, 'failed': 0, 'rejected': 5210, 'retried': 5210, 'batch_bytes': 2883584, 'concurrency': 5, 'latency': 0.41, ...}
+    '''
+
+    def __init__(self, host='localhost', port='9200', timeout=None, min_bytes=65536, max_bytes=16777216, start_bytes=1048576, step_bytes=262144,
+                 min_threads=1, max_threads=8, start_threads=2, target_latency=1.0, decrease=0.5, backoff=0.5, max_retries=5, max_errors=1000):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.min_bytes = min_bytes
+        self.max_bytes = max_bytes
+        self.step_bytes = step_bytes
+        self.min_threads = min_threads
+        self.max_threads = max_threads
+        self.target_latency = target_latency
+        self.decrease = decrease
+        self.backoff = backoff
+        self.max_retries = max_retries
+        self.max_errors = max_errors
+        self.batch_bytes = start_bytes
+        self.concurrency = start_threads
+        self.latency = None
+        self._reset()
+
+    def _reset(self):
+        self.errors = list()
+        self.in_flight = 0
+        self.requests = 0
+        self.indexed = 0
+        self.rejected = 0
+        self.retried = 0
+        self.failed = 0
+        self.increases = 0
+        self.decreases = 0
+        self.elapsed = 0.0
+        self._retry = deque()
+        self._exhausted = False
+        self._epoch = 0
+        self._successes = 0
+        self._resume = 0.0
+
+    def run(self, actions):
+        '''
+        Sends every action and returns the stats, the batch size and concurrency carry over to the next run
+        '''
+        self._reset()
+        url = 'http://%s:%s/_bulk' % (self.host, self.port)
+        tasks = Queue.Queue()
+        results = Queue.Queue()
+        done = object()
+
+        def worker():
+            connection = ElasticConnection(timeout=self.timeout, shared=False)
+            while True:
+                task = tasks.get()
+                if task is done:
+                    return
+                epoch, batch = task
+                started = time.time()
+                try:
+                    response = connection.post_raw(url, ''.join([lines for lines, attempts in batch]))
+                    status = connection.status_code
+                except Exception as e:
+                    response, status = {'error': str(e)}, 0
+                results.put((epoch, batch, status, response, time.time() - started))
+
+        threads = [threading.Thread(target=worker) for i in xrange(self.max_threads)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        source = iter(actions)
+        started = time.time()
+        try:
+            while True:
+                now = time.time()
+                if now >= self._resume:
+                    while self.in_flight < self.concurrency:
+                        batch = self._batch(source)
+                        if not batch:
+                            break
+                        tasks.put((self._epoch, batch))
+                        self.in_flight += 1
+                if not self.in_flight:
+                    if now < self._resume:
+                        time.sleep(self._resume - now)
+                        continue
+                    break
+                try:
+                    outcome = results.get(timeout=self._resume - now if now < self._resume else None)
+                except Queue.Empty:
+                    continue
+                self.in_flight -= 1
+                self._process(*outcome)
+        finally:
+            self.elapsed = time.time() - started
+            for thread in threads:
+                tasks.put(done)
+        return self.stats()
+
+    def _batch(self, source):
+        '''
+        Takes up to batch_bytes of actions, the queued rejected ones first, as (lines, attempts) pairs
+        '''
+        batch = list()
+        size = 0
+        while size < self.batch_bytes:
+            if self._retry:
+                item = self._retry.popleft()
+            elif self._exhausted:
+                break
+            else:
+                try:
+                    item = (source.next(), 0)
+                except StopIteration:
+                    self._exhausted = True
+                    break
+            batch.append(item)
+            size += len(item[0])
+        return batch
+
+    def _process(self, epoch, batch, status, response, latency):
+        self.requests += 1
+        items = response.get('items') if isinstance(response, dict) else None
+        if items is None or len(items) != len(batch):
+            if status in retry_statuses:
+                retry = batch
+            else:
+                retry = list()
+                self._fail(len(batch), {'error': response.get('error', response) if isinstance(response, dict) else response, 'count': len(batch), 'status': status})
+        else:
+            retry = list()
+            for item, result in zip(batch, items):
+                outcome = result.itervalues().next()
+                if 'error' not in outcome and outcome.get('status', 200) < 300:
+                    self.indexed += 1
+                elif rejected(outcome):
+                    retry.append(item)
+                else:
+                    self._fail(1, result)
+        self.rejected += len(retry)
+        for lines, attempts in retry:
+            if attempts < self.max_retries:
+                self._retry.append((lines, attempts + 1))
+                self.retried += 1
+            else:
+                self._fail(1, {'error': 'rejected %d times' % (attempts + 1), 'status': status})
+        self._adjust(epoch, latency, bool(retry))
+
+    def _fail(self, count, error):
+        self.failed += count
+        if len(self.errors) < self.max_errors:
+            self.errors.append(error)
+
+    def _adjust(self, epoch, latency, rejections):
+        self.latency = latency if self.latency is None else self.latency * 0.8 + latency * 0.2
+        if rejections or latency > self.target_latency:
+            if rejections:
+                self._resume = time.time() + self.backoff
+            if epoch < self._epoch:
+                return
+            self.batch_bytes = max(int(self.batch_bytes * self.decrease), self.min_bytes)
+            if rejections:
+                self.concurrency = max(int(self.concurrency * self.decrease), self.min_threads)
+            self._epoch += 1
+            self._successes = 0
+            self.decreases += 1
+            return
+        self.batch_bytes = min(self.batch_bytes + self.step_bytes, self.max_bytes)
+        self._successes += 1
+        if self._successes >= self.concurrency:
+            self.concurrency = min(self.concurrency + 1, self.max_threads)
+            self._successes = 0
+        self.increases += 1
+
+    def stats(self):
+        '''
+        The counters of the current or last run with the batch bytes, concurrency and smoothed latency the controller settled on
+        '''
+        return {
+            'indexed': self.indexed,
+            'failed': self.failed,
+            'rejected': self.rejected,
+            'retried': self.retried,
+            'queued': len(self._retry),
+            'requests': self.requests,
+            'in_flight': self.in_flight,
+            'batch_bytes': self.batch_bytes,
+            'concurrency': self.concurrency,
+            'latency': self.latency,
+            'increases': self.increases,
+            'decreases': self.decreases,
+            'elapsed': self.elapsed,
+            'docs_per_second': self.indexed / self.elapsed if self.elapsed else None
+        }
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+'''
+@author Luke Campbell <LCampbell@ASAScience.com>
+@file async_connection
+@date 10/17/26 10:05
+@description Non-blocking Connection Class for elasticpy
+'''
+from tornado import gen
+from tornado.httpclient import AsyncHTTPClient, HTTPRequest
+
+from codec import get_codec
+
+_use_curl = False
+try:
+    from tornado.curl_httpclient import CurlAsyncHTTPClient
+    _use_curl = True
+except ImportError:
+    pass
+
+
+class AsyncElasticConnection(object):
+    '''
+    Coroutine counterpart of ElasticConnection.
+    Requests go through a tornado AsyncHTTPClient (libcurl's keep-alive connection cache when pycurl is installed)
+    allowing up to max_clients requests in flight at once on the running IOLoop.
+
+    Every method returns a future resolving to the decoded response.
+    The nodes, compression, coalesce and metrics options of ElasticConnection are not supported and raise ValueError.
+    '''
+    unsupported = ('nodes', 'compression', 'coalesce', 'metrics')
+
+    def __init__(self, timeout=None, max_clients=100, codec=None, **params):
+        self.status_code = 0
+        self.timeout = timeout
+        self.codec = codec if hasattr(codec, 'dumps') else get_codec(codec)
+        self.max_clients = max_clients
+        self.encoding = None
+        self.headers = {'Content-Type': 'Application/json; charset=utf-8'}
+        if params.has_key('encoding'):
+            self.encoding = 'utf8'
+            del params['encoding']
+        for name in self.unsupported:
+            # ElasticSearch passes them all, left at their defaults
+            if params.get(name):
+                raise ValueError('%s is not supported by AsyncElasticConnection' % name)
+        self.client = None
+
+    def _client(self):
+        # Created on first use so the client binds to the loop that is actually running the requests
+        if self.client is None:
+            if _use_curl:
+                self.client = CurlAsyncHTTPClient(force_instance=True, max_clients=self.max_clients)
+            else:
+                self.client = AsyncHTTPClient(force_instance=True, max_clients=self.max_clients)
+        return self.client
+
+    @gen.coroutine
+    def fetch(self, method, url, body=None):
+        '''
+        Sends the request and returns (status_code, decoded response)
+        '''
+        request = HTTPRequest(url, method=method, headers=self.headers, body=body, request_timeout=self.timeout, allow_nonstandard_methods=True)
+        response = yield self._client().fetch(request, raise_error=False)
+        if response.code == 599:
+            raise gen.Return((0, {'error': str(response.error)}))
+        raise gen.Return((response.code, self.codec.loads(response.body, encoding=self.encoding)))
+
+    @gen.coroutine
+    def _send(self, method, url, body=None):
+        self.status_code, response = yield self.fetch(method, url, body)
+        raise gen.Return(response)
+
+    def encode(self, data):
+        if isinstance(data, str):
+            return data
+        if isinstance(data, unicode):
+            return data.encode('utf-8')
+        return self.codec.dumps(data)
+
+    def get(self, url):
+        return self._send('GET', url)
+
+    def post(self, url, data):
+        return self._send('POST', url, self.encode(data))
+
+    def post_raw(self, url, body):
+        return self._send('POST', url, body)
+
+    def put(self, url, data):
+        return self._send('PUT', url, self.encode(data))
+
+    def delete(self, url):
+        return self._send('DELETE', url)
+
+    def close(self):
+        if self.client is not None:
+            self.client.close()
+            self.client = None
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+'''
+@author Luke Campbell <LCampbell@ASAScience.com>
+@file async_search
+@date 10/17/26 10:05
+@description Non-blocking interface to ElasticSearch
+'''
+from tornado import gen
+
+from search import ElasticSearch
+from bulk import chunk_actions, bulk_errors
+from async_connection import AsyncElasticConnection
+
+
+class _Unsupported(object):
+    '''
+    Hides a blocking ElasticSearch method from AsyncElasticSearch, the attribute lookup raises AttributeError
+    '''
+
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        raise AttributeError('%s is not supported by AsyncElasticSearch, use ElasticSearch' % self.name)
+
+
+class AsyncElasticSearch(ElasticSearch):
+    '''
+    ElasticSearch with every request method returning a future to yield from a tornado coroutine instead of blocking.
+
+    > search = AsyncElasticSearch(max_clients=200)
+    > response = yield search.search_advanced('twitter','posts',ElasticQuery.term(user='kimchy'))
+
+    The methods that iterate or run on worker threads (bulk_parallel, the streaming searches, scroll, scan,
+    search_fanout, pager and search_results) are not available, and bulk sends a list of actions instead of returning an indexer.
+    '''
+    connection_class = AsyncElasticConnection
+
+    def __init__(self, host='localhost', port='9200', timeout=None, verbose=False, encoding=None, max_clients=100):
+        ElasticSearch.__init__(self, host=host, port=port, timeout=timeout, verbose=verbose, encoding=encoding)
+        self.session.max_clients = max_clients
+
+    @staticmethod
+    def search(index, itype, key, query, host='localhost', port='9200'):
+        return AsyncElasticSearch(host=host, port=port).search_simple(index, itype, key, query)
+
+    @staticmethod
+    def list_indexes(host='localhost', port='9200'):
+        return AsyncElasticSearch(host, port).index_list()
+
+    @staticmethod
+    def list_types(index_name, host='localhost', port='9200'):
+        return AsyncElasticSearch(host=host, port=port).type_list(index_name)
+
+    @staticmethod
+    def raw_query(module, method='GET', data=None, host='localhost', port='9200'):
+        return AsyncElasticSearch(host=host, port=port).raw(module, method, data)
+
+    def _post_search(self, url, index, content):
+        # The cache stores decoded responses, not futures
+        return self.session.post(url, content)
+
+    @gen.coroutine
+    def msearch(self, searches, chunk_size=100):
+        '''
+        Same as ElasticSearch.msearch, the chunks are sent one after the other
+        '''
+        url = 'http://%s:%s/_msearch' % (self.host, self.port)
+        responses = list()
+        for start in xrange(0, len(searches), chunk_size):
+            chunk = searches[start:start + chunk_size]
+            response = yield self.session.post_raw(url, self._msearch_body(chunk))
+            if 'responses' in response:
+                responses.extend(response['responses'])
+            else:
+                responses.extend([response] * len(chunk))
+        raise gen.Return(responses)
+
+    @gen.coroutine
+    def bulk(self, actions, chunk_size=500, max_bytes=5242880):
+        '''
+        Sends encoded bulk actions (see bulk_action) in _bulk requests of up to chunk_size actions and max_bytes,
+        one after the other, and returns the failed items (see bulk_errors)
+        > errors = yield search.bulk(bulk_action('index','twitter','tweet',doc) for doc in documents)
+        '''
+        url = 'http://%s:%s/_bulk' % (self.host, self.port)
+        errors = list()
+        for chunk in chunk_actions(actions, chunk_size, max_bytes):
+            response = yield self.session.post_raw(url, ''.join(chunk))
+            errors.extend(bulk_errors(response, len(chunk)))
+        raise gen.Return(errors)
+
+    @gen.coroutine
+    def index_list(self):
+        '''
+        Lists indices
+        '''
+        url = 'http://%s:%s/_cluster/state/' % (self.host, self.port)
+        status_code, response = yield self.session.fetch('GET', url)
+        if status_code == 200:
+            raise gen.Return(response.get('metadata', {}).get('indices', {}).keys())
+        raise gen.Return(response)
+
+    @gen.coroutine
+    def type_list(self, index_name):
+        '''
+        List the types available in an index
+        '''
+        url = 'http://%s:%s/%s/_mapping' % (self.host, self.port, index_name)
+        status_code, response = yield self.session.fetch('GET', url)
+        if status_code == 200:
+            raise gen.Return(response[index_name].keys())
+        raise gen.Return(response)
+
+    @gen.coroutine
+    def raw(self, module, method='GET', data=None):
+        '''
+        Submits or requsts raw input
+        '''
+        if method not in ('GET', 'POST', 'PUT', 'DELETE'):
+            raise gen.Return({'error': 'No such request method %s' % method})
+        response = yield ElasticSearch.raw(self, module, method, data)
+        raise gen.Return(response)
+
+for _name in ('bulk_parallel', 'search_advanced_stream', 'search_index_stream', 'scroll', 'scan', 'search_fanout', 'pager', 'search_results'):
+    setattr(AsyncElasticSearch, _name, _Unsupported(_name))
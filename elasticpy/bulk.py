@@ -5,8 +5,202 @@
 @date 05/24/12 09:58
 @description bulk support
 '''
+import time
+import threading
+
+from connection import ElasticConnection
+from codec import get_codec
+from workers import imap_bounded
+
+
+def bulk_action(op, index, itype, doc=None, doc_id=None):
+    '''
+    Encodes a single bulk action as the newline delimited lines expected by the _bulk API.
+    op is one of index, create or delete, delete actions carry no document.
+
+    > bulk_action('index', 'twitter', 'tweet', {'user':'kimchy'}, '1')
+      '{"index": {"_index": "twitter", "_type": "tweet", "_id": "1"}}\\n{"user": "kimchy"}\\n'
+    '''
+    codec = get_codec()
+    header = {'_index': index, '_type': itype}
+    if doc_id is not None:
+        header['_id'] = doc_id
+    lines = codec.dumps({op: header}) + '\n'
+    if op != 'delete':
+        lines += codec.dumps(doc) + '\n'
+    return lines
+
+
+def bulk_errors(response, count):
+    '''
+    Returns the failed items of a _bulk response.
+    If the request itself failed every action in it is reported by a single entry.
+    '''
+    if 'items' not in response:
+        return [{'error': response.get('error', response), 'count': count}]
+    errors = list()
+    for item in response['items']:
+        for result in item.itervalues():
+            if 'error' in result:
+                errors.append(item)
+    return errors
+
 
 class ElasticBulk(object):
-    def __init__(self):
-        raise NotImplementedError('ElasticBulk is not yet implemented.')
+    '''
+    Bulk indexer for ElasticSearch
+    http://www.elasticsearch.org/guide/reference/api/bulk.html
+
+    Actions are buffered and submitted in a single _bulk request whenever the number of buffered actions reaches chunk_size,
+    the encoded body reaches max_bytes or flush_interval seconds have passed since the last flush.
+    Items the server failed are collected in errors.
+
+    With flush_interval a daemon thread also flushes the buffer when that many seconds pass without a flush, so actions
+    appended before a pause are not held back until the next append. The flushes then happen on either thread and the
+    session shouldn't be used by anything else. close(), or leaving a with block, stops the thread and flushes.
+
+    > bulk = ElasticSearch().bulk(chunk_size=1000)
+    > bulk.index('twitter', 'tweet', {'user':'kimchy'}, '1')
+    > bulk.delete('twitter', 'tweet', '2')
+    > bulk.flush()
+    '''
+
+    def __init__(self, host='localhost', port='9200', timeout=None, chunk_size=500, max_bytes=5242880, flush_interval=None, session=None):
+        self.host = host
+        self.port = port
+        self.chunk_size = chunk_size
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.session = session or ElasticConnection(timeout=timeout, host=host, port=port)
+        self.errors = list()
+        self._buffer = list()
+        self._bytes = 0
+        self._last_flush = time.time()
+        self._lock = threading.RLock()
+        self._closed = threading.Event()
+        self._timer = None
+        if flush_interval is not None:
+            self._timer = threading.Thread(target=self._flush_periodically)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def __len__(self):
+        return len(self._buffer)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        '''
+        Stops the flush_interval thread and flushes what is left, returns the _bulk response or None
+        '''
+        self._closed.set()
+        if self._timer is not None and self._timer is not threading.current_thread():
+            self._timer.join()
+        return self.flush()
+
+    def _flush_periodically(self):
+        while not self._closed.is_set():
+            self._closed.wait(max(self._last_flush + self.flush_interval - time.time(), 0.001))
+            with self._lock:
+                if self._closed.is_set() or time.time() - self._last_flush < self.flush_interval:
+                    continue
+                try:
+                    self.flush()
+                except Exception as e:
+                    self.errors.append({'error': str(e)})
+
+    def index(self, index, itype, doc, doc_id=None):
+        '''
+        Indexes a document, replacing any document with the same id
+        '''
+        return self.append(bulk_action('index', index, itype, doc, doc_id))
+
+    def create(self, index, itype, doc, doc_id=None):
+        '''
+        Indexes a document only if a document with the same id does not exist
+        '''
+        return self.append(bulk_action('create', index, itype, doc, doc_id))
+
+    def delete(self, index, itype, doc_id):
+        '''
+        Deletes a document by id
+        '''
+        return self.append(bulk_action('delete', index, itype, doc_id=doc_id))
+
+    def append(self, lines):
+        '''
+        Buffers an encoded action (see bulk_action) and flushes if any of the limits are reached.
+        Returns the bulk response if a flush happened otherwise None
+        '''
+        with self._lock:
+            self._buffer.append(lines)
+            self._bytes += len(lines)
+            if len(self._buffer) >= self.chunk_size or self._bytes >= self.max_bytes:
+                return self.flush()
+            if self.flush_interval is not None and time.time() - self._last_flush >= self.flush_interval:
+                return self.flush()
+            return None
+
+    def flush(self):
+        '''
+        Submits the buffered actions, returns the _bulk response or None if there was nothing to send
+        '''
+        with self._lock:
+            self._last_flush = time.time()
+            if not self._buffer:
+                return None
+            body = ''.join(self._buffer)
+            count = len(self._buffer)
+            self._buffer = list()
+            self._bytes = 0
+            url = 'http://%s:%s/_bulk' % (self.host, self.port)
+            response = self.session.post_raw(url, body)
+            self.errors.extend(bulk_errors(response, count))
+            return response
+
+
+
+def chunk_actions(actions, chunk_size=500, max_bytes=5242880):
+    '''
+    Groups encoded actions (see bulk_action) into lists bounded by chunk_size actions and max_bytes bytes
+    '''
+    chunk = list()
+    size = 0
+    for lines in actions:
+        if chunk and (len(chunk) >= chunk_size or size + len(lines) > max_bytes):
+            yield chunk
+            chunk = list()
+            size = 0
+        chunk.append(lines)
+        size += len(lines)
+    if chunk:
+        yield chunk
+
+
+def parallel_bulk(chunks, host='localhost', port='9200', timeout=None, thread_count=4, queue_size=4):
+    '''
+    Submits pre-chunked bulk actions on thread_count worker threads, each with its own ElasticConnection.
+    No more than thread_count + queue_size chunks are held in memory at once.
+    Yields (ok, count, response) for every chunk as it completes, ok is False if the request or any of its items failed.
+
+    > actions = (bulk_action('index', 'twitter', 'tweet', doc) for doc in documents)
+    > for ok, count, response in parallel_bulk(chunk_actions(actions, 1000), thread_count=8):
+    >     if not ok:
+    >         print bulk_errors(response, count)
+    '''
+    url = 'http://%s:%s/_bulk' % (host, port)
+
+    def submit(connection, chunk):
+        return connection.post_raw(url, ''.join(chunk))
+
+    def connect():
+        return ElasticConnection(timeout=timeout, shared=False)
 
+    for ok, chunk, response in imap_bounded(submit, chunks, thread_count, queue_size, connect):
+        if not ok:
+            response = {'error': str(response)}
+        yield not bulk_errors(response, len(chunk)), len(chunk), response
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+'''
+@author Luke Campbell <LCampbell@ASAScience.com>
+@file cache
+@date 10/17/26 15:10
+@description Client side cache for search results
+'''
+import time
+import hashlib
+import simplejson
+from collections import OrderedDict
+
+try:
+    from gevent.coros import RLock
+except ImportError:
+    from threading import RLock
+
+
+def canonical(value):
+    '''
+    Encodes value with sorted keys so equal queries always produce the same string
+    '''
+    return simplejson.dumps(value, sort_keys=True, separators=(',', ':'))
+
+
+def _copy(value):
+    '''
+    Copies the dicts and lists of a decoded response, much faster than copy.deepcopy since the rest can't be modified
+    '''
+    if isinstance(value, dict):
+        return dict((k, _copy(v)) for k, v in value.iteritems())
+    if isinstance(value, list):
+        return [_copy(v) for v in value]
+    return value
+
+
+class ElasticCache(object):
+    '''
+    LRU cache of search responses, shared by any number of ElasticSearch instances.
+
+    max_entries - the least recently used entry is evicted beyond this many entries
+    ttl - seconds an entry stays valid, None keeps entries until evicted
+    max_bytes - evicts entries until the sum of the cached response sizes is below this
+
+    Entries are invalidated when a document is created in, or the mapping of, their index changes through ElasticSearch,
+    or the index is closed or deleted. Writes made by other clients are only picked up when the entry expires.
+    Responses are copied in and out, so callers are free to modify them.
+
+    > cache = ElasticCache(max_entries=10000, ttl=60)
+    > search = ElasticSearch(cache=cache)
+    > search.search_advanced('twitter','tweet',query) # Sent
+    > search.search_advanced('twitter','tweet',query) # Cached
+    > cache.stats()
+      {'hits': 1, 'misses': 1, 'evictions': 0, 'invalidations': 0, 'entries': 1, 'bytes': 1312}
+    '''
+
+    def __init__(self, max_entries=1000, ttl=None, max_bytes=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict() # key -> (expires, indexes, size, response)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._lock = RLock()
+
+    def key(self, url, content):
+        return hashlib.sha1(canonical([url, content])).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            entry = self.entries.pop(key, None)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] is not None and entry[0] < time.time():
+                self.bytes -= entry[2]
+                self.evictions += 1
+                self.misses += 1
+                return None
+            self.entries[key] = entry
+            self.hits += 1
+        return _copy(entry[3])
+
+    def put(self, key, index, response, size):
+        expires = time.time() + self.ttl if self.ttl is not None else None
+        response = _copy(response)
+        with self._lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[2]
+            self.entries[key] = (expires, frozenset(index.split(',')), size, response)
+            self.bytes += size
+            while len(self.entries) > self.max_entries or (self.max_bytes is not None and self.bytes > self.max_bytes and self.entries):
+                key, entry = self.entries.popitem(last=False)
+                self.bytes -= entry[2]
+                self.evictions += 1
+
+    def invalidate(self, index=None):
+        '''
+        Drops every entry that searched index, or every entry if index is None
+        '''
+        with self._lock:
+            if index is None:
+                self.invalidations += len(self.entries)
+                self.entries.clear()
+                self.bytes = 0
+                return
+            for key, entry in self.entries.items():
+                if index in entry[1] or '_all' in entry[1]:
+                    del self.entries[key]
+                    self.bytes -= entry[2]
+                    self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'entries': len(self.entries),
+                'bytes': self.bytes
+            }
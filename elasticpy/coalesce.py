@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+'''
+@author Luke Campbell <LCampbell@ASAScience.com>
+@file coalesce
+@date 10/17/26 16:02
+@description Coalescing of identical concurrent requests
+'''
+
+try:
+    from gevent.coros import RLock
+    from gevent.event import Event
+except ImportError:
+    from threading import RLock, Event
+
+
+class _Call(object):
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self):
+        self.event = Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    '''
+    Runs at most one call per key at a time, callers arriving while a call for their key is in flight
+    wait for it and receive the same result (or exception) instead of making their own.
+    Works across threads, or greenlets when gevent is installed.
+
+    > flights = SingleFlight()
+    > response = flights.do(('POST', url, body), lambda: send(url, body))
+    '''
+
+    def __init__(self):
+        self.calls = dict()
+        self.shared = 0
+        self._lock = RLock()
+
+    def do(self, key, func):
+        with self._lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = _Call()
+            else:
+                self.shared += 1
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = func()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self.calls[key]
+            call.event.set()
+        return call.result
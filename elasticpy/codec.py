@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+'''
+@author Luke Campbell <LCampbell@ASAScience.com>
+@file codec
+@date 10/17/26 13:40
+@description JSON encoders/decoders used on the wire
+'''
+
+
+class JsonCodec(object):
+    '''
+    Encodes request bodies and decodes responses with the standard library json module.
+    Subclasses wrap faster implementations with the same interface.
+    '''
+    name = 'json'
+
+    def __init__(self):
+        import json
+        self.module = json
+
+    def dumps(self, value):
+        return self.module.dumps(value)
+
+    def loads(self, text, encoding=None):
+        return self.module.loads(text, encoding=encoding)
+
+
+class SimpleJsonCodec(JsonCodec):
+    '''
+    simplejson, fast when its C speedups are compiled
+    '''
+    name = 'simplejson'
+
+    def __init__(self):
+        import simplejson
+        self.module = simplejson
+
+
+class UJsonCodec(JsonCodec):
+    '''
+    ujson, the fastest encoder and decoder but it ignores encoding and doesn't support Decimal
+    '''
+    name = 'ujson'
+
+    def __init__(self):
+        import ujson
+        self.module = ujson
+
+    def loads(self, text, encoding=None):
+        return self.module.loads(text)
+
+
+codecs = [UJsonCodec, SimpleJsonCodec, JsonCodec] # Fastest first
+_default = None
+
+
+def available_codecs():
+    '''
+    Returns an instance of every codec whose module can be imported, fastest first
+    '''
+    instances = list()
+    for codec in codecs:
+        try:
+            instances.append(codec())
+        except ImportError:
+            pass
+    return instances
+
+
+def get_codec(name=None):
+    '''
+    Returns the codec with the given name, or the default codec: the fastest one available unless set_codec was called.
+    > get_codec('simplejson').dumps({'query': {'match_all': {}}})
+    '''
+    global _default
+    if name is not None:
+        for codec in codecs:
+            if codec.name == name:
+                return codec()
+        raise ValueError('Unknown codec %s' % name)
+    if _default is None:
+        _default = available_codecs()[0]
+    return _default
+
+
+def set_codec(name):
+    '''
+    Sets the default codec used by connections created afterwards
+    '''
+    global _default
+    _default = get_codec(name)
@@ -5,74 +5,376 @@
 @date 05/24/12 09:29
 @description Connection Class for elasticpy
 '''
+import gzip
+import zlib
+import time
+from cStringIO import StringIO
 import requests
-import simplejson as json
+import requests.adapters
+from requests.packages.urllib3.exceptions import NewConnectionError
+from collections import OrderedDict
+
+from nodepool import ElasticNodePool
+from codec import get_codec
+from coalesce import SingleFlight
+from metrics import ElasticTiming
 
 
-_use_gevent = False
 try:
-    import gevent
     from gevent.coros import RLock
-    _use_gevent = True
+except ImportError:
+    from threading import RLock
+
+# Methods safe to send again after the node may have received them
+idempotent_methods = ('GET', 'HEAD', 'PUT', 'DELETE')
+
+_use_ijson = False
+try:
+    import ijson
+    _use_ijson = True
 except ImportError:
     pass
 
 
+class ElasticSessionRegistry(object):
+    '''
+    Process wide pool of requests sessions keyed by (host, port, timeout).
+    Every ElasticConnection to the same node shares one session, and with it the session's keep-alive connections,
+    so short lived ElasticSearch instances (the staticmethod helpers) don't pay for a new TCP handshake on every call.
+
+    pool_size - the number of sessions kept, the least recently used session is dropped beyond that
+    max_idle - the number of idle keep-alive connections each session keeps per node
+
+    > ElasticSessionRegistry.configure(pool_size=4, max_idle=32)
+    '''
+    pool_size = 16
+    max_idle = 10
+    sessions = OrderedDict()
+    lock = RLock()
+
+    @classmethod
+    def configure(cls, pool_size=None, max_idle=None):
+        with cls.lock:
+            if pool_size is not None:
+                cls.pool_size = pool_size
+            if max_idle is not None:
+                cls.max_idle = max_idle
+            cls.clear()
+
+    @classmethod
+    def create(cls):
+        '''
+        Creates a session configured with the registry's limits without registering it
+        '''
+        session = requests.Session()
+        session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=cls.max_idle))
+        return session
+
+    @classmethod
+    def get(cls, host, port, timeout=None):
+        key = (host, str(port), timeout)
+        with cls.lock:
+            session = cls.sessions.pop(key, None)
+            if session is None:
+                session = cls.create()
+            cls.sessions[key] = session
+            while len(cls.sessions) > cls.pool_size:
+                # Connections still holding the session keep using it, it's closed when they are collected
+                cls.sessions.popitem(last=False)
+            return session
+
+    @classmethod
+    def clear(cls):
+        with cls.lock:
+            cls.sessions.clear()
+
+
 class ElasticConnection(object):
-    if _use_gevent:
-        session = None
-        session_lock = RLock()
+    flights = SingleFlight()
 
-    def __init__(self, timeout=None, **params):
+    def __init__(self, timeout=None, nodes=None, selector='round_robin', dead_timeout=60, max_retries=None, host='localhost', port='9200', shared=True, codec=None,
+                 compression=None, compression_level=6, compression_threshold=1024, accept_encoding='gzip, deflate', coalesce=False, metrics=None, **params):
+        '''
+        Connections share a session from ElasticSessionRegistry unless shared is False,
+        in which case they get a session of their own (e.g. one per worker thread).
+        codec is a codec instance or name (see codec.py), defaults to the fastest one installed.
+
+        compression - 'gzip' or 'deflate' to compress request bodies of at least compression_threshold bytes
+                      (the nodes need http.compression enabled)
+        compression_level - zlib level, 1 is fastest, 9 is smallest
+        accept_encoding - the response encodings to accept, None asks for uncompressed responses
+
+        coalesce - identical searches and GETs made at the same time by any coalescing connection in the process
+                   share a single request, every caller gets the same decoded response which must not be modified
+
+        metrics - an ElasticMetrics timing every request sent, coalesced callers that didn't send it are not timed
+        '''
+        if compression not in (None, 'gzip', 'deflate'):
+            raise ValueError('Unknown compression %s' % compression)
         self.status_code = 0
+        self.response_size = 0
         self.timeout = timeout
+        self.codec = codec if hasattr(codec, 'dumps') else get_codec(codec)
+        self.compression = compression
+        self.compression_level = compression_level
+        self.compression_threshold = compression_threshold
+        self.coalesce = coalesce
+        self.metrics = metrics
         self.encoding = None
-        self.headers = {'Content-Type': 'Application/json; charset=utf-8'}
+        self.headers = {'Content-Type': 'Application/json; charset=utf-8', 'Accept-Encoding': accept_encoding or 'identity'}
         if params.has_key('encoding'):
             self.encoding = 'utf8'
             del params['encoding']
-        if _use_gevent:
-            if ElasticConnection.session is None:
-                ElasticConnection.session_lock.acquire()
-                ElasticConnection.session = requests.Session(**params)
-                ElasticConnection.session_lock.release()
+        if shared:
+            self.session = ElasticSessionRegistry.get(host, port, timeout)
         else:
-            self.session = requests.Session(timeout=timeout, **params)
+            self.session = ElasticSessionRegistry.create()
+        self.pool = None
+        self.max_retries = max_retries
+        if nodes:
+            self.pool = ElasticNodePool(nodes, selector=selector, dead_timeout=dead_timeout, probe=self._probe)
+            if max_retries is None:
+                self.max_retries = len(self.pool.nodes) - 1
 
-    def get(self, url):
+    def _probe(self, node):
         try:
-            response = self.session.get(url, headers=self.headers, timeout=self.timeout)
-        except requests.ConnectionError as e:
-            self.status_code = 0
-            return {'error': e.message}
-        self.status_code = response.status_code
-        return json.loads(response.content, encoding=self.encoding)
+            self.session.head('http://%s:%s/' % node, timeout=self.timeout or 5)
+        except requests.RequestException:
+            return False
+        return True
 
-    def post(self, url, data):
-        body = json.dumps(data)
+    def _request(self, method, url, body=None, encoded=None):
+        fetch = self._fetch
+        if self.metrics is not None:
+            fetch = lambda method, url, body: self._timed_fetch(method, url, body, encoded)
+        if self.coalesce and self._coalescable(method, url):
+            result = ElasticConnection.flights.do((method, url, body), lambda: fetch(method, url, body))
+        else:
+            result = fetch(method, url, body)
+        self.status_code, self.response_size, response = result
+        return response
+
+    def _fetch(self, method, url, body=None):
+        '''
+        Returns (status_code, response_size, decoded response)
+        '''
         try:
-            response = self.session.post(url, data=body, headers=self.headers, timeout=self.timeout)
+            response = self._send(method, url, body)
         except requests.ConnectionError as e:
-            self.status_code = 0
-            return {'error': e.message}
-        self.status_code = response.status_code
-        return json.loads(response.content, encoding=self.encoding)
+            return 0, 0, {'error': e.message}
+        return response.status_code, len(response.content), self.codec.loads(response.content, encoding=self.encoding)
 
-    def put(self, url, data):
-        body = json.dumps(data)
+    def _timed_fetch(self, method, url, body, encoded):
+        '''
+        Same as _fetch, recording the time spent in every phase of the request in metrics
+        '''
+        timing = ElasticTiming(method, url)
+        timing.encode = encoded
+        timing.request_size = len(body) if body else 0
+        started = time.time()
         try:
-            response = self.session.post(url, data=body, headers=self.headers, timeout=self.timeout)
+            response = self._send(method, url, body)
         except requests.ConnectionError as e:
-            self.status_code = 0
-            return {'error': e.message}
+            timing.total = time.time() - started + (encoded or 0)
+            self.metrics.record(timing)
+            return 0, 0, {'error': e.message}
+        received = time.time()
+        timing.send = response.elapsed.total_seconds()
+        timing.transfer = max(received - started - timing.send, 0)
+        content = response.content
+        decoded = self.codec.loads(content, encoding=self.encoding)
+        timing.decode = time.time() - received
+        timing.total = time.time() - started + (encoded or 0)
+        timing.status_code = response.status_code
+        timing.response_size = len(content)
+        if isinstance(decoded, dict) and isinstance(decoded.get('took'), (int, long)):
+            timing.took = decoded['took'] / 1000.0
+        self.metrics.record(timing)
+        return response.status_code, len(content), decoded
+
+    def _timing(self, method, url, body, started):
+        '''
+        An ElasticTiming for a request whose response isn't decoded by _fetch, None without metrics
+        '''
+        if self.metrics is None:
+            return None
+        timing = ElasticTiming(method, url)
+        timing.encode = time.time() - started
+        timing.request_size = len(body) if body else 0
+        return timing
+
+    def _record(self, timing, started, response=None, response_size=0):
+        '''
+        Records a timing from _timing once the request is done, the transfer of a streamed response includes decoding its items
+        '''
+        if timing is None:
+            return
+        timing.total = time.time() - started
+        if response is not None:
+            timing.send = response.elapsed.total_seconds()
+            timing.transfer = max(timing.total - timing.encode - timing.send, 0)
+            timing.status_code = response.status_code
+            timing.response_size = response_size
+        self.metrics.record(timing)
+
+    @staticmethod
+    def _coalescable(method, url):
+        # Reads only, scroll requests open or advance a server side context and must each be sent
+        if method == 'GET':
+            return True
+        if method != 'POST' or 'scroll' in url:
+            return False
+        path = url.split('?', 1)[0].rstrip('/')
+        return path.endswith('/_search') or path.endswith('/_msearch')
+
+    def _send(self, method, url, body=None, stream=False):
+        '''
+        Sends the request, with a node pool the host and port of url are replaced by the node chosen by the pool
+        and connection errors are retried on other nodes up to max_retries times.
+        A request the node may have received (the connection failed after it was opened) is only sent again if its method
+        is idempotent, a POST could otherwise be applied twice (auto id creates, _bulk).
+        '''
+        headers = self.headers
+        if self.compression and body is not None and len(body) >= self.compression_threshold:
+            body = self.compress(body)
+            headers = dict(headers)
+            headers['Content-Encoding'] = self.compression
+        if self.pool is None:
+            return self.session.request(method, url, data=body, headers=headers, timeout=self.timeout, stream=stream)
+        path = url.split('/', 3)[3]
+        for attempt in xrange(self.max_retries + 1):
+            node = self.pool.acquire()
+            if node is None:
+                raise requests.ConnectionError('No live nodes')
+            try:
+                return self.session.request(method, 'http://%s:%s/%s' % (node[0], node[1], path), data=body, headers=headers, timeout=self.timeout, stream=stream)
+            except requests.ConnectionError as e:
+                self.pool.mark_dead(node)
+                if attempt == self.max_retries or not (method in idempotent_methods or _not_sent(e)):
+                    raise
+            finally:
+                self.pool.release(node)
+
+    def compress(self, body):
+        if self.compression == 'deflate':
+            return zlib.compress(body, self.compression_level)
+        buf = StringIO()
+        gz = gzip.GzipFile(fileobj=buf, mode='wb', compresslevel=self.compression_level)
+        gz.write(body)
+        gz.close()
+        return buf.getvalue()
+
+    def encode(self, data):
+        '''
+        Encodes a request body, strings are taken to be encoded already and are sent as they are
+        '''
+        if isinstance(data, str):
+            return data
+        if isinstance(data, unicode):
+            return data.encode('utf-8')
+        return self.codec.dumps(data)
+
+    def get(self, url):
+        return self._request('GET', url)
+
+    def post(self, url, data):
+        if self.metrics is None:
+            return self._request('POST', url, self.encode(data))
+        started = time.time()
+        body = self.encode(data)
+        return self._request('POST', url, body, time.time() - started)
+
+    def post_raw(self, url, body):
+        '''
+        Posts an already encoded body, used by requests that are not a single json document (_bulk)
+        '''
+        return self._request('POST', url, body)
+
+    def post_text(self, url, data):
+        '''
+        Same as post but returns the response body undecoded, an empty string if the request failed
+        '''
+        started = time.time()
+        body = self.encode(data)
+        timing = self._timing('POST', url, body, started)
+        try:
+            response = self._send('POST', url, body)
+        except requests.ConnectionError:
+            self.status_code, self.response_size = 0, 0
+            self._record(timing, started)
+            return ''
         self.status_code = response.status_code
-        return json.loads(response.content, encoding=self.encoding)
+        self.response_size = len(response.content)
+        self._record(timing, started, response, self.response_size)
+        return response.content
+
+    def put(self, url, data):
+        if self.metrics is None:
+            return self._request('POST', url, self.encode(data))
+        started = time.time()
+        body = self.encode(data)
+        return self._request('POST', url, body, time.time() - started)
 
     def delete(self, url):
+        return self._request('DELETE', url)
+
+    def stream(self, url, data, prefix='hits.hits.item'):
+        '''
+        Posts data and yields the items found at prefix (an ijson path) as the response is read,
+        so only one item is held in memory at a time. Floating point values are decoded as Decimal.
+        Without ijson installed the response is decoded whole and the items are yielded from it.
+
+        Nothing is yielded if the request fails, check status_code.
+        > for hit in connection.stream(url, {'query': query}):
+        >     print hit['_id']
+        '''
+        started = time.time()
+        body = self.encode(data)
+        timing = self._timing('POST', url, body, started)
         try:
-            response = self.session.delete(url, headers=self.headers, timeout=self.timeout)
-        except requests.ConnectionError as e:
+            response = self._send('POST', url, body, stream=True)
+        except requests.ConnectionError:
             self.status_code = 0
-            return {'error': e.message}
+            self._record(timing, started)
+            return
         self.status_code = response.status_code
-        return json.loads(response.content, encoding=self.encoding)
+        try:
+            if response.status_code != 200:
+                return
+            if _use_ijson:
+                response.raw.decode_content = True
+                for item in ijson.items(response.raw, prefix):
+                    yield item
+                return
+            for item in _walk(self.codec.loads(response.content, encoding=self.encoding), prefix.split('.')):
+                yield item
+        finally:
+            response.close()
+            self._record(timing, started, response, int(response.headers.get('Content-Length') or 0))
+
+
+def _not_sent(error):
+    '''
+    True if a connection error happened before the request could reach the node: the connection was refused or timed out
+    '''
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = error.args[0] if error.args else None
+    return isinstance(getattr(reason, 'reason', reason), NewConnectionError)
+
+
+def _walk(value, path):
+    '''
+    Yields the values found at an ijson style path ('item' matches every element of a list) of a decoded document
+    '''
+    if not path:
+        yield value
+        return
+    key, rest = path[0], path[1:]
+    if key == 'item' and isinstance(value, list):
+        for element in value:
+            for item in _walk(element, rest):
+                yield item
+    elif isinstance(value, dict) and key in value:
+        for item in _walk(value[key], rest):
+            yield item
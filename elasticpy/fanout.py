@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+'''
+@author Luke Campbell <LCampbell@ASAScience.com>
+@file fanout
+@date 10/17/26 19:40
+@description Merges the responses of the same search sent to many indexes
+'''
+import heapq
+
+from sort import sort_keys
+
+
+class _Descending(object):
+    '''
+    Wraps a sort value so it orders in reverse
+    '''
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return self.value > other.value
+
+    def __gt__(self, other):
+        return self.value < other.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+    def __ne__(self, other):
+        return self.value != other.value
+
+
+def sort_orders(spec):
+    '''
+    Returns a list of True (descending) or False for every key of a sort spec, None sorts on _score.
+    > sort_orders(ElasticSort().sort('date', 'desc').sort('name'))
+      [True, False]
+    '''
+    keys = sort_keys(spec)
+    if not keys:
+        return None
+    return [descending for field, descending in keys]
+
+
+def hit_key(hit, orders):
+    '''
+    Key ordering hits the way the search did, missing values sort last
+    '''
+    if orders is None:
+        score = hit.get('_score')
+        return ((score is None, _Descending(score)),)
+    values = hit.get('sort') or []
+    key = list()
+    for position, descending in enumerate(orders):
+        value = values[position] if position < len(values) else None
+        key.append((value is None, _Descending(value) if descending else value))
+    return tuple(key)
+
+
+def merge_hits(hit_lists, orders, limit):
+    '''
+    k-way merge of already sorted hit lists, returns the first limit hits.
+    Ties keep the order of hit_lists.
+    '''
+    heap = list()
+    for number, hits in enumerate(hit_lists):
+        if hits:
+            heap.append((hit_key(hits[0], orders), number, 0))
+    heapq.heapify(heap)
+    merged = list()
+    while heap and len(merged) < limit:
+        key, number, position = heapq.heappop(heap)
+        hits = hit_lists[number]
+        merged.append(hits[position])
+        position += 1
+        if position < len(hits):
+            heapq.heappush(heap, (hit_key(hits[position], orders), number, position))
+    return merged
+
+
+def merge_responses(responses, failures, orders, offset, size):
+    '''
+    Combines the search responses of several indexes into a single response holding hits offset to offset + size of the merged order.
+    Totals, shard counts and took are summed (took is the slowest index), indexes that failed are listed in failures.
+    '''
+    total = 0
+    max_score = None
+    took = 0
+    timed_out = False
+    shards = {'total': 0, 'successful': 0, 'failed': 0}
+    hit_lists = list()
+    for response in responses:
+        hits = response.get('hits', {})
+        total += hits.get('total', 0)
+        score = hits.get('max_score')
+        if score is not None and (max_score is None or score > max_score):
+            max_score = score
+        took = max(took, response.get('took', 0))
+        timed_out = timed_out or response.get('timed_out', False)
+        for name in shards:
+            shards[name] += response.get('_shards', {}).get(name, 0)
+        hit_lists.append(hits.get('hits', []))
+    merged = merge_hits(hit_lists, orders, offset + size)
+    return {
+        'took': took,
+        'timed_out': timed_out,
+        '_shards': shards,
+        'hits': {'total': total, 'max_score': max_score, 'hits': merged[offset:]},
+        'failures': failures
+    }
@@ -5,30 +5,43 @@
 @date 05/24/12 09:32
 @description Filters for searching
 '''
+from optimize import optimize_filter
+
+
+# Filters whose parsers reject _cache and _cache_key
+uncacheable = ('exists', 'missing', 'ids', 'limit', 'type', 'match_all', 'has_child')
 
 
 class ElasticFilter(dict):
 
     '''
     Wrapper for ElasticSearch filters
+
+    The builders of filters the server can cache take cache and cache_key, the _cache and _cache_key hints of the filter:
+    cache=True keeps the filter's bitset in the node's filter cache, cache=False skips caching a one-off filter,
+    None leaves the server default. cache_key names the cached bitset so it can be cleared by key.
+    exists, missing, ids, limit, type, match_all and has_child reject the hints, so they don't take them.
+    > ElasticFilter.term('user', 'kimchy', cache=True)
+      {'term': {'user': 'kimchy', '_cache': True}}
+    > ElasticFilter.range('age', from_value=10, cache=False)
     '''
 
     @classmethod
-    def and_filter(cls, query):
+    def and_filter(cls, query, cache=None, cache_key=None):
         '''
         http://www.elasticsearch.org/guide/reference/query-dsl/and-filter.html
         A filter that matches documents using AND boolean operator on other queries. This filter is more performant then bool filter. Can be placed within queries that accept a filter.
         '''
-        return cls({'and': query})
+        return cls({'and': query})._hints(cache, cache_key)
 
     @classmethod
-    def bool_filter(cls, query):
+    def bool_filter(cls, query, cache=None, cache_key=None):
         '''
         http://www.elasticsearch.org/guide/reference/query-dsl/bool-filter.html
         A filter that matches documents matching boolean combinations of other queries. Similar in concept to Boolean query, except that the clauses are other filters. Can be placed within queries that accept a filter.
         '''
 
-        return cls({'bool': query})
+        return cls({'bool': query})._hints(cache, cache_key)
 
     @classmethod
     def exists(cls, field):
@@ -71,7 +84,7 @@ Filters documents matching the provided document / mapping type. Note, this filt
         return cls(type={'value': value})
 
     @classmethod
-    def geo_bounding_box(cls, field, top_left, bottom_right):
+    def geo_bounding_box(cls, field, top_left, bottom_right, cache=None, cache_key=None):
         '''
         http://www.elasticsearch.org/guide/reference/query-dsl/geo-bounding-box-filter.html
 
@@ -82,10 +95,10 @@ Filters documents matching the provided document / mapping type. Note, this filt
         > bounds = ElasticFilter().geo_bounding_box('pin.location', "drm3btev3e86", "drm3btev3e86")
 
         '''
-        return cls(geo_bounding_box={field: {'top_left': top_left, 'bottom_right': bottom_right}})
+        return cls(geo_bounding_box={field: {'top_left': top_left, 'bottom_right': bottom_right}})._hints(cache, cache_key)
 
     @classmethod
-    def geo_distance(cls, field, center, distance, distance_type=None):
+    def geo_distance(cls, field, center, distance, distance_type=None, cache=None, cache_key=None):
         '''
         http://www.elasticsearch.org/guide/reference/query-dsl/geo-distance-filter.html
         Filters documents that include only hits that exists within a specific distance from a geo point.
@@ -99,10 +112,10 @@ Filters documents matching the provided document / mapping type. Note, this filt
         instance = cls(geo_distance={'distance': distance, field: center})
         if distance_type is not None:
             instance['geo_distance']['distance_type'] = distance_type
-        return instance
+        return instance._hints(cache, cache_key)
 
     @classmethod
-    def geo_distance_range(cls, field, center, from_distance, to_distance, distance_type=None):
+    def geo_distance_range(cls, field, center, from_distance, to_distance, distance_type=None, cache=None, cache_key=None):
         '''
         http://www.elasticsearch.org/guide/reference/query-dsl/geo-distance-range-filter.html
         Filters documents that exists within a range from a specific point
@@ -112,10 +125,10 @@ Filters documents matching the provided document / mapping type. Note, this filt
         instance = cls(geo_distance_range={'from': from_distance, 'to': to_distance, field: center})
         if distance_type is not None:
             instance['geo_distance_range']['distance_type'] = distance_type
-        return instance
+        return instance._hints(cache, cache_key)
 
     @classmethod
-    def geo_polygon(cls, field, points):
+    def geo_polygon(cls, field, points, cache=None, cache_key=None):
         '''
         http://www.elasticsearch.org/guide/reference/query-dsl/geo-polygon-filter.html
         A filter allowing to include hits that only fall within a polygon of points.
@@ -123,7 +136,7 @@ Filters documents matching the provided document / mapping type. Note, this filt
 
         > filter = ElasticFilter().geo_polygon('pin.location', [[40, -70], [30, -80], [20, -90]])
         '''
-        return cls(geo_polygon={field: {'points': points}})
+        return cls(geo_polygon={field: {'points': points}})._hints(cache, cache_key)
 
     @classmethod
     def has_child(cls, child_type, query):
@@ -158,16 +171,16 @@ Filters documents matching the provided document / mapping type. Note, this filt
         return cls(missing={'field': field})
 
     @classmethod
-    def not_filter(cls, query):
+    def not_filter(cls, query, cache=None, cache_key=None):
         '''
         http://www.elasticsearch.org/guide/reference/query-dsl/not-filter.html
         A filter that filters out matched documents using a query. This filter is more performant then bool filter. Can be placed within queries that accept a filter.
 
         '''
-        return cls({'not': query})
+        return cls({'not': query})._hints(cache, cache_key)
 
     @classmethod
-    def numeric_range(cls, field, from_value, to_value, include_lower=None, include_upper=None):
+    def numeric_range(cls, field, from_value, to_value, include_lower=None, include_upper=None, cache=None, cache_key=None):
         '''
         http://www.elasticsearch.org/guide/reference/query-dsl/numeric-range-filter.html
         Filters documents with fields that have values within a certain numeric range. Similar to range filter, except that it works only with numeric values, and the filter execution works differently.
@@ -177,10 +190,10 @@ Filters documents matching the provided document / mapping type. Note, this filt
             instance['numeric_range'][field]['include_lower'] = include_lower
         if include_upper is not None:
             instance['numeric_range'][field]['include_upper'] = include_upper
-        return instance
+        return instance._hints(cache, cache_key)
 
     @classmethod
-    def or_filter(cls, query):
+    def or_filter(cls, query, cache=None, cache_key=None):
         '''
         http://www.elasticsearch.org/guide/reference/query-dsl/or-filter.html
 
@@ -191,27 +204,27 @@ Filters documents matching the provided document / mapping type. Note, this filt
         > filter = ElasticFilter().or_filter([term1, term2])
         '''
 
-        return cls({'or': query})
+        return cls({'or': query})._hints(cache, cache_key)
 
     @classmethod
-    def prefix(cls, field, pre):
+    def prefix(cls, field, pre, cache=None, cache_key=None):
         '''
         http://www.elasticsearch.org/guide/reference/query-dsl/prefix-filter.html
         Filters documents that have fields containing terms with a specified prefix (not analyzed). Similar to phrase query, except that it acts as a filter. Can be placed within queries that accept a filter.
         '''
 
-        return cls(prefix={field: pre})
+        return cls(prefix={field: pre})._hints(cache, cache_key)
 
     @classmethod
-    def query(cls, query):
+    def query(cls, query, cache=None, cache_key=None):
         '''
         http://www.elasticsearch.org/guide/reference/query-dsl/query-filter.html
         Wraps any query to be used as a filter. Can be placed within queries that accept a filter.
         '''
-        return cls(query=query)
+        return cls(query=query)._hints(cache, cache_key)
 
     @classmethod
-    def range(cls, field, from_value=None, to_value=None, include_lower=None, include_upper=None):
+    def range(cls, field, from_value=None, to_value=None, include_lower=None, include_upper=None, cache=None, cache_key=None):
         '''
         http://www.elasticsearch.org/guide/reference/query-dsl/range-filter.html
 
@@ -228,24 +241,66 @@ Filters documents matching the provided document / mapping type. Note, this filt
         if include_upper is not None:
             instance['range'][field]['include_upper'] = include_upper
 
-        return instance
+        return instance._hints(cache, cache_key)
 
     @classmethod
-    def script(cls, script):
+    def script(cls, script, params=None, cache=None, cache_key=None):
         '''
         http://www.elasticsearch.org/guide/reference/query-dsl/script-filter.html
         A filter allowing to define scripts as filters.
+        params are variables of the script, a script that only changes by its params is compiled once.
 
         > script = 'doc["num1"].value > 1'
         > filter = ElasticFilter().script(script)
+        > filter = ElasticFilter().script('doc["num1"].value > param1', params={'param1': 5})
         '''
-        return cls(script=script)
+        if params is not None:
+            return cls(script={'script': script, 'params': params})._hints(cache, cache_key)
+        return cls(script=script)._hints(cache, cache_key)
 
     @classmethod
-    def term(cls, field, value):
+    def term(cls, field, value, cache=None, cache_key=None):
         '''
         http://www.elasticsearch.org/guide/reference/query-dsl/term-filter.html
         Filters documents that have fields that contain a term (not analyzed). Similar to term query, except that it acts as a filter.
         '''
 
-        return cls(term={field: value})
+        return cls(term={field: value})._hints(cache, cache_key)
+
+    def cached(self, cache=True, cache_key=None):
+        '''
+        Sets the cache hints of an existing filter, see the class documentation
+        > ElasticFilter.and_filter([f1, f2]).cached(cache_key='active_users')
+          {'and': {'filters': [f1, f2], '_cache': True, '_cache_key': 'active_users'}}
+        '''
+        return self._hints(cache, cache_key)
+
+    def _hints(self, cache, cache_key):
+        if cache is None and cache_key is None:
+            return self
+        name, body = self.items()[0]
+        if name in uncacheable:
+            raise ValueError('The %s filter does not take cache hints' % name)
+        # Filters whose body isn't an object take the hints in their long form
+        if name in ('and', 'or') and not isinstance(body, dict):
+            body = {'filters': body}
+        elif name == 'not' and not (isinstance(body, dict) and 'filter' in body):
+            body = {'filter': body}
+        elif name == 'query':
+            name, body = 'fquery', {'query': body}
+        elif name == 'script' and not isinstance(body, dict):
+            body = {'script': body}
+        if cache is not None:
+            body['_cache'] = cache
+        if cache_key is not None:
+            body['_cache_key'] = cache_key
+        self.clear()
+        self[name] = body
+        return self
+
+    def optimize(self, debug=False):
+        '''
+        Returns an equivalent filter rewritten into a cheaper form, see optimize.optimize_filter
+        With debug the filter is printed before and after.
+        '''
+        return optimize_filter(self, debug)
@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+'''
+@author Luke Campbell <LCampbell@ASAScience.com>
+@file loader
+@date 10/17/26 23:10
+@description Streams NDJSON and CSV files into an index with parallel bulk requests
+'''
+import os
+import re
+import csv
+import time
+import mmap
+
+from connection import ElasticConnection
+from codec import get_codec
+from bulk import bulk_action, bulk_errors
+from workers import imap_bounded
+
+
+# A line holding nothing but whitespace, in the middle of a block
+_blank_line = re.compile(r'\n[ \t\r\f\v]*\n')
+
+
+def _records(data):
+    '''
+    The non blank lines of a str or mmap, without their line endings
+    '''
+    start = 0
+    size = len(data)
+    while start < size:
+        end = data.find('\n', start)
+        if end < 0:
+            end = size
+        line = data[start:end].strip()
+        if line:
+            yield line
+        start = end + 1
+
+
+def ndjson_chunks(data, header, max_bytes=5242880):
+    '''
+    Splits newline delimited json documents into _bulk bodies of about max_bytes and yields (count, body).
+    data is a str or mmap, header is the encoded action line prepended to every document.
+    Documents are not decoded: each body is sliced from data in one piece and the action lines are inserted with a single replace,
+    so the cost per document stays in C.
+    '''
+    start = 0
+    size = len(data)
+    while start < size:
+        end = data.find('\n', min(start + max_bytes, size) - 1)
+        if end < 0:
+            end = size
+        block = data[start:end]
+        start = end + 1
+        if '\r' in block:
+            block = block.replace('\r\n', '\n')
+        if block[:1].isspace() or block[-1:].isspace() or _blank_line.search(block):
+            block = '\n'.join([line.strip() for line in block.split('\n') if line.strip()])
+        if not block:
+            continue
+        yield block.count('\n') + 1, header + block.replace('\n', '\n' + header) + '\n'
+
+
+class ElasticLoader(object):
+    '''
+    Loads NDJSON or CSV files into an index.
+    Files are memory mapped and split into _bulk requests submitted on thread_count worker threads.
+    The reader stays at most thread_count + queue_size requests ahead of the senders, so memory use is bounded by
+    (thread_count + queue_size) * max_bytes whatever the size of the file, and the mapped pages are left to the OS page cache.
+
+    op - index, or create to leave existing documents alone
+    max_bytes - approximate size of every _bulk request
+    max_errors - failed items kept in errors, the rest are only counted
+
+    > loader = ElasticLoader(thread_count=8)
+    > loader.load_ndjson('/data/tweets.json', 'twitter', 'tweet')
+      {'docs': 1000000, 'failed': 0, 'requests': 230, 'bytes': 1210443211, 'elapsed': 61.2, 'parse': 3.1, 'docs_per_second': 16339.8}
+    > loader.load_csv('/data/users.csv', 'twitter', 'user', id_field='id', transform=lambda doc: dict(doc, age=int(doc['age'])))
+    '''
+
+    def __init__(self, host='localhost', port='9200', timeout=None, thread_count=4, queue_size=4, max_bytes=5242880, op='index', max_errors=1000):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.thread_count = thread_count
+        self.queue_size = queue_size
+        self.max_bytes = max_bytes
+        self.op = op
+        self.max_errors = max_errors
+        self.codec = get_codec()
+        self._reset()
+
+    def _reset(self):
+        self.errors = list()
+        self.docs = 0
+        self.failed = 0
+        self.requests = 0
+        self.bytes = 0
+        self.parse = 0.0
+        self.elapsed = 0.0
+
+    def load_ndjson(self, path, index, itype, id_field=None, transform=None):
+        '''
+        Loads a file of one json document per line.
+        Without id_field or transform the lines are sent as they are and the ids are generated by ElasticSearch,
+        otherwise every document is decoded, passed to transform (which returns the document to index or None to skip it)
+        and indexed with the id found in id_field.
+        '''
+        with open(path, 'rb') as f:
+            data = self._map(f)
+            try:
+                if id_field is None and transform is None:
+                    header = self.codec.dumps({self.op: {'_index': index, '_type': itype}}) + '\n'
+                    return self._load(ndjson_chunks(data, header, self.max_bytes))
+                documents = (self.codec.loads(line) for line in _records(data))
+                return self._load(self._encode(documents, index, itype, id_field, transform))
+            finally:
+                if data:
+                    data.close()
+
+    def load_csv(self, path, index, itype, id_field=None, transform=None, fieldnames=None, **fmtparams):
+        '''
+        Loads a csv file, every row is indexed as a document of strings keyed by the column names.
+        The column names are read from the first row unless fieldnames is given, fmtparams are passed to csv.reader (delimiter, quotechar, ...).
+        transform returns the document to index (e.g. with its values converted) or None to skip the row.
+        '''
+        with open(path, 'rb') as f:
+            data = self._map(f)
+            if not data:
+                return self._load([])
+            try:
+                rows = csv.DictReader(iter(data.readline, ''), fieldnames, **fmtparams)
+                return self._load(self._encode(rows, index, itype, id_field, transform))
+            finally:
+                data.close()
+
+    def _map(self, f):
+        if not os.fstat(f.fileno()).st_size:
+            return ''
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _encode(self, documents, index, itype, id_field, transform):
+        actions = list()
+        size = 0
+        for document in documents:
+            if transform is not None:
+                document = transform(document)
+                if document is None:
+                    continue
+            doc_id = document.get(id_field) if id_field is not None else None
+            lines = bulk_action(self.op, index, itype, document, doc_id)
+            if actions and size + len(lines) > self.max_bytes:
+                yield len(actions), ''.join(actions)
+                actions = list()
+                size = 0
+            actions.append(lines)
+            size += len(lines)
+        if actions:
+            yield len(actions), ''.join(actions)
+
+    def _load(self, chunks):
+        '''
+        Sends the (count, body) chunks and returns the stats
+        '''
+        self._reset()
+        url = 'http://%s:%s/_bulk' % (self.host, self.port)
+        timed = self._timed(chunks)
+
+        def submit(connection, chunk):
+            return connection.post_raw(url, chunk[1])
+
+        def connect():
+            return ElasticConnection(timeout=self.timeout, shared=False)
+
+        started = time.time()
+        try:
+            for ok, chunk, response in imap_bounded(submit, timed, self.thread_count, self.queue_size, connect):
+                if not ok:
+                    response = {'error': str(response)}
+                count = chunk[0]
+                self.requests += 1
+                self.docs += count
+                errors = bulk_errors(response, count)
+                if errors:
+                    self.failed += sum(error.get('count', 1) for error in errors)
+                    self.errors.extend(errors[:self.max_errors - len(self.errors)])
+        finally:
+            self.elapsed = time.time() - started
+        return self.stats()
+
+    def _timed(self, chunks):
+        '''
+        Passes the chunks through, adding the time spent producing them to parse
+        '''
+        chunks = iter(chunks)
+        while True:
+            started = time.time()
+            try:
+                chunk = chunks.next()
+            except StopIteration:
+                self.parse += time.time() - started
+                return
+            self.parse += time.time() - started
+            self.bytes += len(chunk[1])
+            yield chunk
+
+    def stats(self):
+        '''
+        parse is the time spent reading and splitting the file, the rest of elapsed was spent waiting on the cluster
+        '''
+        return {
+            'docs': self.docs,
+            'failed': self.failed,
+            'requests': self.requests,
+            'bytes': self.bytes,
+            'elapsed': self.elapsed,
+            'parse': self.parse,
+            'docs_per_second': self.docs / self.elapsed if self.elapsed else None
+        }
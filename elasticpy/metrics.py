@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+'''
+@author Luke Campbell <LCampbell@ASAScience.com>
+@file metrics
+@date 10/17/26 21:15
+@description Request phase timings and latency histograms
+'''
+import math
+
+try:
+    from gevent.coros import RLock
+except ImportError:
+    from threading import RLock
+
+
+phases = ('encode', 'send', 'took', 'transfer', 'decode', 'total')
+
+
+def endpoint(method, url):
+    '''
+    Groups requests by API rather than by index or document
+    > endpoint('POST', 'http://localhost:9200/twitter/tweet/_search?scroll=1m')
+      'POST _search'
+    > endpoint('GET', 'http://localhost:9200/twitter/tweet/1')
+      'GET document'
+    '''
+    path = url.split('?', 1)[0]
+    if '://' in path:
+        path = path.split('/', 3)[3] if path.count('/') > 2 else ''
+    segments = [segment for segment in path.split('/') if segment]
+    api = [segment for segment in segments if segment.startswith('_')]
+    if api:
+        return '%s %s' % (method, '/'.join(api))
+    return '%s %s' % (method, ('root', 'index', 'type', 'document')[min(len(segments), 3)])
+
+
+class ElasticTiming(object):
+    '''
+    Timings of a single request in seconds, None for phases that didn't happen
+    encode - encoding the request body
+    send - connecting, sending the request and waiting for the response headers
+    took - the search time reported by the server (part of send)
+    transfer - reading the response body, it also holds compressing the request and retries on other nodes
+    decode - decoding the response body
+    total - all of the above
+    '''
+    __slots__ = ('method', 'url', 'endpoint', 'status_code', 'request_size', 'response_size') + phases
+
+    def __init__(self, method, url):
+        self.method = method
+        self.url = url
+        self.endpoint = endpoint(method, url)
+        self.status_code = 0
+        self.request_size = 0
+        self.response_size = 0
+        for phase in phases:
+            setattr(self, phase, None)
+
+    def __repr__(self):
+        return '<ElasticTiming %s %s %s>' % (self.endpoint, self.status_code, ' '.join('%s=%.2fms' % (phase, getattr(self, phase) * 1e3) for phase in phases if getattr(self, phase) is not None))
+
+
+class ElasticHistogram(object):
+    '''
+    Latency histogram with logarithmic buckets, percentiles are accurate to within growth (10%) of the value.
+    Values below minimum (0.1ms) or above maximum (300s) fall in the first or last bucket.
+    '''
+    __slots__ = ('minimum', 'growth', 'buckets', 'count', 'sum', 'min', 'max', '_log_growth')
+
+    def __init__(self, minimum=0.0001, maximum=300.0, growth=1.1):
+        self.minimum = minimum
+        self.growth = growth
+        self._log_growth = math.log(growth)
+        self.buckets = [0] * (int(math.log(maximum / minimum) / self._log_growth) + 2)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def record(self, value):
+        if value <= self.minimum:
+            bucket = 0
+        else:
+            bucket = min(int(math.log(value / self.minimum) / self._log_growth) + 1, len(self.buckets) - 1)
+        self.buckets[bucket] += 1
+        self.count += 1
+        self.sum += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def percentile(self, percent):
+        '''
+        The value below which percent of the recorded values fall, None if nothing was recorded
+        '''
+        if not self.count:
+            return None
+        rank = max(int(math.ceil(self.count * percent / 100.0)), 1)
+        seen = 0
+        for bucket, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank:
+                upper = self.minimum * self.growth ** bucket
+                return min(max(upper, self.min), self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean': self.sum / self.count if self.count else None,
+            'min': self.min,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'max': self.max
+        }
+
+
+class ElasticMetrics(object):
+    '''
+    Aggregates the ElasticTimings of every request made by the connections it's given to into a histogram per endpoint and phase,
+    and passes each timing to the registered callbacks, e.g. to forward them to statsd.
+    Connections without metrics don't time anything.
+
+    > metrics = ElasticMetrics()
+    > metrics.subscribe(lambda timing: statsd.timing('es.%s' % timing.endpoint, timing.total * 1000))
+    > search = ElasticSearch(metrics=metrics)
+    > ... searches ...
+    > metrics.summary()['POST _search']['total']
+      {'count': 1200, 'mean': 0.012, 'min': 0.004, 'p50': 0.009, 'p90': 0.021, 'p99': 0.061, 'max': 0.2}
+    '''
+
+    def __init__(self):
+        self.histograms = dict() # endpoint -> {phase: ElasticHistogram}
+        self.callbacks = list()
+        self._lock = RLock()
+
+    def subscribe(self, callback):
+        '''
+        Calls callback(timing) after every request, in the thread that made the request.
+        Exceptions raised by callbacks are not caught.
+        '''
+        self.callbacks.append(callback)
+
+    def unsubscribe(self, callback):
+        self.callbacks.remove(callback)
+
+    def record(self, timing):
+        with self._lock:
+            histograms = self.histograms.get(timing.endpoint)
+            if histograms is None:
+                histograms = self.histograms[timing.endpoint] = dict((phase, ElasticHistogram()) for phase in phases)
+            for phase in phases:
+                value = getattr(timing, phase)
+                if value is not None:
+                    histograms[phase].record(value)
+        for callback in self.callbacks:
+            callback(timing)
+
+    def summary(self):
+        '''
+        Returns {endpoint: {phase: {count, mean, min, p50, p90, p99, max}}} in seconds
+        '''
+        with self._lock:
+            return dict((name, dict((phase, histogram.summary()) for phase, histogram in histograms.iteritems() if histogram.count))
+                        for name, histograms in self.histograms.iteritems())
+
+    def clear(self):
+        with self._lock:
+            self.histograms.clear()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+'''
+@author Luke Campbell <LCampbell@ASAScience.com>
+@file nodepool
+@date 10/17/26 11:20
+@description Node selection and failover for a cluster of ElasticSearch nodes
+'''
+import time
+
+try:
+    from gevent.coros import RLock
+except ImportError:
+    from threading import RLock
+
+
+def parse_node(node, default_port='9200'):
+    '''
+    Accepts 'host', 'host:port' or (host, port) and returns (host, port)
+    '''
+    if isinstance(node, (tuple, list)):
+        return tuple(node)
+    if ':' in node:
+        return tuple(node.rsplit(':', 1))
+    return (node, default_port)
+
+
+class ElasticNodePool(object):
+    '''
+    Spreads requests across a list of nodes.
+
+    selector is either 'round_robin' or 'least_in_flight'.
+    A node that fails with a connection error is marked dead and skipped. Once dead_timeout seconds have passed
+    it is probed (probe(node) returning True if the node answers) the next time a node is acquired; a failed
+    probe doubles the node's timeout up to max_dead_timeout.
+
+    > pool = ElasticNodePool(['es1:9200', 'es2:9200'], selector='least_in_flight')
+    > node = pool.acquire()
+    > ...
+    > pool.release(node)
+    '''
+
+    def __init__(self, nodes, selector='round_robin', dead_timeout=60, max_dead_timeout=3600, probe=None):
+        if selector not in ('round_robin', 'least_in_flight'):
+            raise ValueError('Unknown node selector %s' % selector)
+        self.nodes = [parse_node(node) for node in nodes]
+        if not self.nodes:
+            raise ValueError('At least one node is required')
+        self.selector = selector
+        self.dead_timeout = dead_timeout
+        self.max_dead_timeout = max_dead_timeout
+        self.probe = probe
+        self.live = list(self.nodes)
+        self.dead = dict() # node -> (retry_at, failures)
+        self.in_flight = dict((node, 0) for node in self.nodes)
+        self._next = 0
+        self._lock = RLock()
+
+    def acquire(self):
+        '''
+        Returns the node to send the next request to or None if every node is dead
+        '''
+        self.resurrect()
+        with self._lock:
+            if not self.live:
+                return None
+            if self.selector == 'least_in_flight':
+                node = min(self.live, key=self.in_flight.get)
+            else:
+                node = self.live[self._next % len(self.live)]
+                self._next += 1
+            self.in_flight[node] += 1
+            return node
+
+    def release(self, node):
+        with self._lock:
+            self.in_flight[node] -= 1
+
+    def mark_dead(self, node):
+        with self._lock:
+            if node in self.live:
+                self.live.remove(node)
+                failures = 0
+            else:
+                failures = self.dead.get(node, (0, 0))[1]
+            timeout = min(self.dead_timeout * 2 ** failures, self.max_dead_timeout)
+            self.dead[node] = (time.time() + timeout, failures + 1)
+
+    def mark_live(self, node):
+        with self._lock:
+            if node in self.dead:
+                del self.dead[node]
+            if node not in self.live:
+                self.live.append(node)
+
+    def resurrect(self):
+        '''
+        Probes the dead nodes whose timeout has expired and brings back the ones that answer.
+        Without a probe the nodes are returned to the live list and have to prove themselves on the next request.
+        If every node is dead the one closest to its retry time is tried regardless.
+        '''
+        with self._lock:
+            if not self.dead:
+                return
+            now = time.time()
+            due = [node for node, (retry_at, failures) in self.dead.iteritems() if retry_at <= now]
+            if not due and not self.live:
+                due = [min(self.dead, key=lambda node: self.dead[node][0])]
+            for node in due:
+                # Push the retry time forward so concurrent callers don't probe the same node
+                self.dead[node] = (now + self.dead_timeout, self.dead[node][1])
+        for node in due:
+            if self.probe is None or self.probe(node):
+                self.mark_live(node)
+            else:
+                self.mark_dead(node)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'live': list(self.live),
+                'dead': dict((node, retry_at) for node, (retry_at, failures) in self.dead.iteritems()),
+                'in_flight': dict(self.in_flight)
+            }
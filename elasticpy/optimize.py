@@ -0,0 +1,275 @@
+#!/usr/bin/env python
+'''
+@author Luke Campbell <LCampbell@ASAScience.com>
+@file optimize
+@date 10/17/26 17:25
+@description Rewrites query and filter trees into cheaper equivalent forms
+'''
+import simplejson
+
+
+def _key(clause):
+    # Canonical form used to spot duplicate clauses, placeholders and other objects compare by repr
+    return simplejson.dumps(clause, sort_keys=True, default=repr)
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    return [value]
+
+
+def _dedup(clauses):
+    seen = set()
+    unique = list()
+    for clause in clauses:
+        key = _key(clause)
+        if key not in seen:
+            seen.add(key)
+            unique.append(clause)
+    return unique
+
+
+def _single(clause, name):
+    '''
+    Returns the body of clause if it is a one key dict {name: body}
+    '''
+    if isinstance(clause, dict) and len(clause) == 1 and name in clause:
+        return clause[name]
+    return None
+
+
+def _merge_terms(clauses, filters=False):
+    '''
+    Merges term clauses on the same field into a single terms clause, for clauses that are OR'ed together.
+    Terms with options (boost, _cache) are left alone.
+    '''
+    fields = dict()
+    order = list()
+    for clause in clauses:
+        term = _single(clause, 'term')
+        if isinstance(term, dict) and len(term) == 1 and not isinstance(term.values()[0], dict):
+            field, value = term.items()[0]
+            if field not in fields:
+                fields[field] = list()
+                order.append(('field', field))
+            fields[field].append(value)
+        else:
+            order.append(('clause', clause))
+    merged = list()
+    for kind, item in order:
+        if kind == 'clause':
+            merged.append(item)
+        elif len(fields[item]) == 1:
+            merged.append({'term': {item: fields[item][0]}})
+        elif filters:
+            merged.append({'terms': {item: fields[item]}})
+        else:
+            merged.append({'terms': {item: fields[item], 'minimum_match': 1}})
+    return merged
+
+
+def _optimize_bool(body):
+    if not isinstance(body, dict):
+        return {'bool': body}
+    options = dict((k, v) for k, v in body.iteritems() if k not in ('must', 'should', 'must_not'))
+    msm = options.get('minimum_number_should_match')
+    must = [_optimize_query(q) for q in _as_list(body.get('must'))]
+    should = [_optimize_query(q) for q in _as_list(body.get('should'))]
+    must_not = [_optimize_query(q) for q in _as_list(body.get('must_not'))]
+
+    had_must = bool(must)
+
+    # Flatten nested bools that add nothing but another level
+    flat_must, flat_should, flat_must_not = list(), list(), list()
+    for q in must:
+        inner = _single(q, 'bool')
+        if isinstance(inner, dict) and set(inner) <= set(['must', 'must_not']):
+            flat_must.extend(_as_list(inner.get('must')))
+            flat_must_not.extend(_as_list(inner.get('must_not')))
+        else:
+            flat_must.append(q)
+    for q in should:
+        inner = _single(q, 'bool')
+        if msm is None and isinstance(inner, dict) and set(inner) == set(['should']):
+            flat_should.extend(_as_list(inner['should']))
+        else:
+            flat_should.append(q)
+    for q in must_not:
+        inner = _single(q, 'bool')
+        if isinstance(inner, dict) and set(inner) == set(['should']):
+            flat_must_not.extend(_as_list(inner['should']))
+        else:
+            flat_must_not.append(q)
+
+    must = _dedup(flat_must)
+    must_not = _merge_terms(_dedup(flat_must_not))
+    should = flat_should
+    if msm is None:
+        should = _merge_terms(_dedup(should))
+
+    # Clauses that match without scoring are moved out of the query into a (cacheable) filter
+    filters = list()
+    scoring = list()
+    for q in must:
+        constant = _single(q, 'constant_score')
+        if isinstance(constant, dict) and set(constant) == set(['filter']):
+            filters.append(constant['filter'])
+        elif _single(q, 'match_all') == {}:
+            continue
+        else:
+            scoring.append(q)
+    if had_must and not scoring and (should or must_not):
+        # A bool with no must clause requires a should clause to match, keep it optional
+        # (must clauses may also have been flattened away, e.g. a nested bool with only must_not)
+        scoring = [{'match_all': {}}]
+    must = scoring
+
+    if not must and not should and not must_not:
+        query = {'match_all': {}}
+    elif len(must) == 1 and not should and not must_not and not options:
+        query = must[0]
+    elif len(should) == 1 and not must and not must_not and not options:
+        query = should[0]
+    else:
+        bool_body = dict(options)
+        if must:
+            bool_body['must'] = must
+        if should:
+            bool_body['should'] = should
+        if must_not:
+            bool_body['must_not'] = must_not
+        query = {'bool': bool_body}
+
+    if not filters:
+        return query
+    efilter = filters[0] if len(filters) == 1 else {'and': filters}
+    return {'filtered': {'query': query, 'filter': _optimize_filter(efilter)}}
+
+
+def _optimize_query(query):
+    if not isinstance(query, dict) or len(query) != 1:
+        return query
+    name, body = query.items()[0]
+    if name == 'bool':
+        return _optimize_bool(body)
+    if name == 'filtered' and isinstance(body, dict):
+        body = dict(body)
+        if 'query' in body:
+            body['query'] = _optimize_query(body['query'])
+        if 'filter' in body:
+            body['filter'] = _optimize_filter(body['filter'])
+        return {'filtered': body}
+    if name == 'constant_score' and isinstance(body, dict) and 'filter' in body:
+        body = dict(body)
+        body['filter'] = _optimize_filter(body['filter'])
+        return {'constant_score': body}
+    return query
+
+
+def _optimize_clauses(name, body):
+    '''
+    and/or filters: flattens nested filters of the same kind, removes duplicates and merges terms for or
+    '''
+    options = dict()
+    if isinstance(body, dict):
+        options = dict((k, v) for k, v in body.iteritems() if k != 'filters')
+        body = body.get('filters', [])
+    flat = list()
+    for f in _as_list(body):
+        f = _optimize_filter(f)
+        inner = _single(f, name)
+        if isinstance(inner, list):
+            flat.extend(inner)
+        elif isinstance(inner, dict) and set(inner) == set(['filters']):
+            flat.extend(inner['filters'])
+        else:
+            flat.append(f)
+    flat = _dedup(flat)
+    if name == 'or':
+        flat = _merge_terms(flat, filters=True)
+    if len(flat) == 1 and not options:
+        return flat[0]
+    if options:
+        options['filters'] = flat
+        return {name: options}
+    return {name: flat}
+
+
+def _optimize_filter(efilter):
+    if not isinstance(efilter, dict) or len(efilter) != 1:
+        return efilter
+    name, body = efilter.items()[0]
+    if name in ('and', 'or'):
+        return _optimize_clauses(name, body)
+    if name == 'not':
+        wrapped = isinstance(body, dict) and set(body) == set(['filter'])
+        inner = _optimize_filter(body['filter'] if wrapped else body)
+        double = _single(inner, 'not')
+        if isinstance(double, dict) and set(double) == set(['filter']):
+            return double['filter']
+        if double is not None and not (isinstance(double, dict) and '_cache' in double):
+            return double
+        return {'not': {'filter': inner}} if wrapped else {'not': inner}
+    if name == 'bool' and isinstance(body, dict):
+        optimized = dict(body)
+        for occur in ('must', 'should', 'must_not'):
+            if occur in body:
+                optimized[occur] = _dedup([_optimize_filter(f) for f in _as_list(body[occur])])
+        if 'should' in optimized:
+            optimized['should'] = _merge_terms(optimized['should'], filters=True)
+        return {'bool': optimized}
+    if name == 'query':
+        return {'query': _optimize_query(body)}
+    if name == 'fquery' and isinstance(body, dict) and 'query' in body:
+        body = dict(body)
+        body['query'] = _optimize_query(body['query'])
+        return {'fquery': body}
+    return efilter
+
+
+def _show(label, tree):
+    print '%s: %s' % (label, simplejson.dumps(tree, sort_keys=True, default=repr))
+
+
+def optimize_query(query, debug=False):
+    '''
+    Returns an equivalent, cheaper version of query:
+    - nested bool queries that only add a level are flattened into their parent
+    - duplicate clauses are removed
+    - term queries on the same field in should or must_not are merged into one terms query
+    - constant_score filters and match_all in must are moved into a filtered query's filter, where they can be cached
+    - bool queries left with a single clause are replaced by the clause
+    Documents matched are unchanged, scores may differ by constant factors.
+    With debug the tree is printed before and after.
+
+    > optimize_query(ElasticQuery.bool(should=[ElasticQuery.term(tag='blue'), ElasticQuery.term(tag='pill')]))
+      {'terms': {'tag': ['blue', 'pill'], 'minimum_match': 1}}
+    '''
+    optimized = _optimize_query(query)
+    if debug:
+        _show('before', query)
+        _show('after', optimized)
+    if isinstance(query, dict) and type(optimized) is dict and type(query) is not dict:
+        optimized = type(query)(optimized)
+    return optimized
+
+
+def optimize_filter(efilter, debug=False):
+    '''
+    Returns an equivalent, cheaper version of efilter:
+    - nested and/or filters are flattened into their parent
+    - duplicate filters are removed
+    - term filters on the same field in or (and bool should) are merged into one terms filter
+    - not(not(f)) becomes f and single filter and/or are replaced by the filter
+    With debug the tree is printed before and after.
+    '''
+    optimized = _optimize_filter(efilter)
+    if debug:
+        _show('before', efilter)
+        _show('after', optimized)
+    if isinstance(efilter, dict) and type(optimized) is dict and type(efilter) is not dict:
+        optimized = type(efilter)(optimized)
+    return optimized
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+'''
+@author Luke Campbell <LCampbell@ASAScience.com>
+@file pager
+@date 10/17/26 20:10
+@description Keyset pagination, every page is found by filtering past the last hit instead of skipping from_offset hits
+'''
+import base64
+
+from filter import ElasticFilter
+from query import ElasticQuery
+from sort import sort_keys
+
+
+def encode_cursor(keys, values, codec):
+    '''
+    Opaque, url safe token holding the sort values of the last hit of a page
+    '''
+    return base64.urlsafe_b64encode(codec.dumps([[field for field, descending in keys], values])).rstrip('=')
+
+
+def decode_cursor(keys, token, codec):
+    '''
+    Returns the sort values of a cursor, raises ValueError if the cursor is malformed or was made for another sort
+    '''
+    try:
+        token = str(token)
+        fields, values = codec.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except (TypeError, ValueError):
+        raise ValueError('Invalid cursor %r' % token)
+    if list(fields) != [field for field, descending in keys] or len(values) != len(keys):
+        raise ValueError('The cursor was made for a different sort')
+    return values
+
+
+def keyset_filter(keys, values):
+    '''
+    Filter matching the documents that sort after values:
+    (k1 after v1) or (k1 = v1 and k2 after v2) or ...
+    '''
+    clauses = list()
+    for position, (field, descending) in enumerate(keys):
+        if descending:
+            after = ElasticFilter.range(field, to_value=values[position], include_upper=False)
+        else:
+            after = ElasticFilter.range(field, from_value=values[position], include_lower=False)
+        equal = [ElasticFilter.term(keys[i][0], values[i]) for i in xrange(position)]
+        clauses.append(ElasticFilter.and_filter(equal + [after]) if equal else after)
+    if len(clauses) == 1:
+        return clauses[0]
+    return ElasticFilter.or_filter(clauses)
+
+
+class ElasticPager(object):
+    '''
+    Pages through a search in the order of the search's sort (sort or sorted), size hits at a time.
+    Instead of from_offset, each page filters for the hits that sort after the last hit of the previous page,
+    so page 500 costs about as much as page 1. tiebreaker is a unique, not analyzed field (the document id stored as a field)
+    appended to the sort so that hits with equal sort values are neither repeated nor skipped.
+
+    Sort keys must be fields, _score and script or geo distance sorts can't be turned into a range.
+    Hits added or removed between pages shift later pages like they would with from_offset, the total of a page
+    counts the hits remaining from its cursor.
+
+    > pager = ElasticSearch().size(20).sort(date='desc').pager('twitter', 'tweet', ElasticQuery.match_all(), 'tweet_id')
+    > response, cursor = pager.page()
+    > response, cursor = pager.page(cursor) # cursor is None after the last page
+    '''
+
+    def __init__(self, search, index, itype, query, tiebreaker):
+        self.search = search
+        self.index = index
+        self.itype = itype
+        self.query = query
+        spec = search.params.get('sort') if search.params else None
+        if not spec:
+            spec = []
+        elif not isinstance(spec, (list, tuple)):
+            spec = [spec]
+        spec = list(spec)
+        keys = sort_keys(spec)
+        if tiebreaker not in [field for field, descending in keys]:
+            spec.append({tiebreaker: {'order': 'asc'}})
+            keys.append((tiebreaker, False))
+        for field, descending in keys:
+            if field in ('_score', '_script', '_geo_distance'):
+                raise ValueError('Keyset paging needs field sorts, %s can not be paged' % field)
+        self.sort = spec
+        self.keys = keys
+
+    def page(self, cursor=None):
+        '''
+        Returns (response, cursor) for the page after cursor, the first page if cursor is None.
+        The returned cursor is None when there are no more pages.
+        '''
+        search = self.search
+        codec = search.session.codec
+        query = self.query
+        if cursor is not None:
+            values = decode_cursor(self.keys, cursor, codec)
+            query = ElasticQuery({'filtered': {'query': query, 'filter': keyset_filter(self.keys, values)}})
+        content = search._query_header(query)
+        content.pop('from', None)
+        content['sort'] = self.sort
+        if self.itype:
+            url = 'http://%s:%s/%s/%s/_search' % (search.host, search.port, self.index, self.itype)
+        else:
+            url = 'http://%s:%s/%s/_search' % (search.host, search.port, self.index)
+        if search.verbose:
+            print content
+        response = search._post_search(url, self.index, content)
+        hits = response.get('hits', {}).get('hits', [])
+        if not hits or len(hits) < content.get('size', 10) or 'sort' not in hits[-1]:
+            return response, None
+        return response, encode_cursor(self.keys, hits[-1]['sort'], codec)
+
+    def __iter__(self):
+        '''
+        Yields every page response in order
+        '''
+        cursor = None
+        while True:
+            response, cursor = self.page(cursor)
+            yield response
+            if cursor is None:
+                return
@@ -5,6 +5,7 @@
 @date 05/24/12 09:31
 @description Query class for ElasticSearch
 '''
+from optimize import optimize_query
 
 
 class ElasticQuery(dict):
@@ -356,3 +357,10 @@ class ElasticQuery(dict):
         > query = ElasticQuery.wildcard('user', 'ki*y')
         '''
         return cls(wildcard={field: value})
+
+    def optimize(self, debug=False):
+        '''
+        Returns an equivalent query rewritten into a cheaper form, see optimize.optimize_query
+        With debug the query is printed before and after.
+        '''
+        return optimize_query(self, debug)
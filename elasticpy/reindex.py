@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+'''
+@author Luke Campbell <LCampbell@ASAScience.com>
+@file reindex
+@date 10/17/26 22:30
+@description Copies an index into another one in parallel slices, with scan and bulk
+
+Usage:
+    elasticpy-reindex SOURCE TARGET [--host localhost] [--port 9200] [--target-host HOST] [--target-port PORT]
+                      [--type TYPE] [--slices 4] [--field _uid] [--transform module:function]
+                      [--chunk-size 500] [--scroll 5m] [--scroll-size 100] [--rate DOCS_PER_SECOND] [--checkpoint FILE]
+'''
+import os
+import sys
+import time
+import argparse
+import simplejson
+
+from connection import ElasticConnection
+from search import ElasticSearch
+from filter import ElasticFilter
+from bulk import ElasticBulk
+from workers import imap_bounded
+
+try:
+    from gevent.coros import RLock
+except ImportError:
+    from threading import RLock
+
+
+# Math.abs of the remainder, hashCode can be negative
+slice_script = "Math.abs(doc[field].value.hashCode() % slices) == slice"
+
+
+class _Throttle(object):
+    '''
+    Spaces out writes so that no more than rate documents per second are sent across all threads
+    '''
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.next = time.time()
+        self._lock = RLock()
+
+    def wait(self, count):
+        if not self.rate:
+            return
+        with self._lock:
+            now = time.time()
+            start = max(self.next, now)
+            self.next = start + float(count) / self.rate
+        if start > now:
+            time.sleep(start - now)
+
+
+class ElasticReindex(object):
+    '''
+    Copies every document of source (matching query) into target.
+    The source is read in slices partitioned by the hash of field (_uid, every document's type#id, by default):
+    each slice is a scan of the documents whose hash falls in it, run on its own thread and written with its own bulk indexer.
+    The hash is computed by a script filter, so field needs to be loaded in the field data cache of the source nodes.
+
+    transform - called with every hit, returns the hit to index (_source, _type and _id may be changed) or None to skip it
+    rate - maximum documents written per second across all slices, None for no limit
+    checkpoint - file recording the slices already copied, rerunning with the same file skips them.
+                 A slice that was interrupted is copied again from its start, documents keep their ids so nothing is duplicated.
+                 Slices whose scan failed or with documents the target rejected are not recorded, a rerun copies them again.
+
+    > reindex = ElasticReindex('tweets_v1', 'tweets_v2', slices=8, checkpoint='/tmp/tweets.json')
+    > reindex.run()
+      {'read': 120000, 'indexed': 120000, 'skipped': 0, 'failed': 0, 'slices_done': 8, 'elapsed': 95.1}
+    '''
+
+    def __init__(self, source, target, host='localhost', port='9200', target_host=None, target_port=None, itype=None, query=None,
+                 slices=4, field='_uid', transform=None, chunk_size=500, scroll='5m', scroll_size=100, rate=None, checkpoint=None, timeout=None):
+        self.source = source
+        self.target = target
+        self.host = host
+        self.port = port
+        self.target_host = target_host or host
+        self.target_port = target_port or port
+        self.itype = itype
+        self.query = query
+        self.slices = slices
+        self.field = field
+        self.transform = transform
+        self.chunk_size = chunk_size
+        self.scroll = scroll
+        self.scroll_size = scroll_size
+        self.timeout = timeout
+        self.checkpoint = checkpoint
+        self.throttle = _Throttle(rate)
+        self.done = set()
+        self.slice_errors = dict() # slice number -> error of its last attempt
+        self.read = 0
+        self.indexed = 0
+        self.skipped = 0
+        self.failed = 0
+        self.elapsed = 0.0
+        self._lock = RLock()
+        if checkpoint and os.path.exists(checkpoint):
+            self._load()
+
+    def _load(self):
+        with open(self.checkpoint) as f:
+            state = simplejson.load(f)
+        if (state['source'], state['target'], state['slices'], state['field']) != (self.source, self.target, self.slices, self.field):
+            raise ValueError('The checkpoint %s was written for another reindex: %s' % (self.checkpoint, state))
+        self.done = set(state['done'])
+
+    def _save(self):
+        state = {'source': self.source, 'target': self.target, 'slices': self.slices, 'field': self.field, 'done': sorted(self.done)}
+        temporary = self.checkpoint + '.tmp'
+        with open(temporary, 'w') as f:
+            simplejson.dump(state, f)
+        os.rename(temporary, self.checkpoint)
+
+    def slice_query(self, number):
+        '''
+        The source query restricted to the documents of slice number
+        '''
+        query = self.query or {'match_all': {}}
+        if self.slices == 1:
+            return query
+        efilter = ElasticFilter.script(slice_script, params={'field': self.field, 'slices': self.slices, 'slice': number})
+        return {'filtered': {'query': query, 'filter': efilter}}
+
+    def copy_slice(self, number):
+        '''
+        Copies one slice, returns the number of documents that failed to be indexed.
+        ElasticScrollError is raised if the scan fails, the slice then has to be copied again.
+        '''
+        # Every slice thread gets connections of its own, the shared session's pool is smaller than two per slice
+        search = ElasticSearch(host=self.host, port=self.port, timeout=self.timeout)
+        search.session = ElasticConnection(timeout=self.timeout, host=self.host, port=self.port, shared=False)
+        bulk = ElasticBulk(self.target_host, self.target_port, self.timeout, chunk_size=self.chunk_size,
+                           session=ElasticConnection(timeout=self.timeout, host=self.target_host, port=self.target_port, shared=False))
+        read = indexed = skipped = sent = 0
+        for hit in search.scan(self.source, self.itype, self.slice_query(number), self.scroll, self.scroll_size):
+            read += 1
+            if self.transform is not None:
+                hit = self.transform(hit)
+                if hit is None:
+                    skipped += 1
+                    continue
+            indexed += 1
+            if bulk.index(self.target, hit['_type'], hit['_source'], hit['_id']) is not None:
+                # Paces the next chunk by the size of the one just written
+                self.throttle.wait(indexed - sent)
+                sent = indexed
+        bulk.flush()
+        failed = sum(error.get('count', 1) for error in bulk.errors)
+        with self._lock:
+            self.read += read
+            self.indexed += indexed - failed
+            self.skipped += skipped
+            self.failed += failed
+        return failed
+
+    def run(self, thread_count=None):
+        '''
+        Copies the slices not done yet, thread_count of them at a time (all of them by default), and returns the stats.
+        Only the slices copied in full are marked done. If a slice raised, the other slices are still finished
+        and the first exception is raised again once they are, the failures of every slice are in slice_errors.
+        '''
+        started = time.time()
+        pending = [number for number in xrange(self.slices) if number not in self.done]
+        raised = None
+        try:
+            for ok, number, result in imap_bounded(self.copy_slice, pending, thread_count or self.slices, 0):
+                with self._lock:
+                    if not ok:
+                        self.slice_errors[number] = str(result)
+                        raised = raised or result
+                        continue
+                    if result:
+                        self.slice_errors[number] = '%d documents failed to be indexed' % result
+                        continue
+                    self.slice_errors.pop(number, None)
+                    self.done.add(number)
+                    if self.checkpoint:
+                        self._save()
+        finally:
+            self.elapsed += time.time() - started
+        if raised is not None:
+            raise raised
+        return self.stats()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'read': self.read,
+                'indexed': self.indexed,
+                'skipped': self.skipped,
+                'failed': self.failed,
+                'slices_done': len(self.done),
+                'slices_failed': len(self.slice_errors),
+                'elapsed': self.elapsed
+            }
+
+
+def _import(path):
+    module, name = path.split(':', 1)
+    return getattr(__import__(module, fromlist=[name]), name)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Copies an ElasticSearch index into another one in parallel slices')
+    parser.add_argument('source')
+    parser.add_argument('target')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', default='9200')
+    parser.add_argument('--target-host')
+    parser.add_argument('--target-port')
+    parser.add_argument('--type', dest='itype', help='only copy this type')
+    parser.add_argument('--slices', type=int, default=4)
+    parser.add_argument('--field', default='_uid', help='field hashed to split the source into slices')
+    parser.add_argument('--transform', help='module:function called with every hit, returning the hit to index or None')
+    parser.add_argument('--chunk-size', type=int, default=500)
+    parser.add_argument('--scroll', default='5m')
+    parser.add_argument('--scroll-size', type=int, default=100, help='hits per shard in every scan page')
+    parser.add_argument('--rate', type=float, help='maximum documents written per second')
+    parser.add_argument('--checkpoint', help='file recording the copied slices, to resume an interrupted reindex')
+    parser.add_argument('--timeout', type=float)
+    args = parser.parse_args(argv)
+    reindex = ElasticReindex(args.source, args.target, args.host, args.port, args.target_host, args.target_port, args.itype,
+                             slices=args.slices, field=args.field, transform=_import(args.transform) if args.transform else None,
+                             chunk_size=args.chunk_size, scroll=args.scroll, scroll_size=args.scroll_size, rate=args.rate,
+                             checkpoint=args.checkpoint, timeout=args.timeout)
+    try:
+        reindex.run()
+    except Exception as e:
+        print >> sys.stderr, 'Reindex failed: %s' % e
+    stats = reindex.stats()
+    print '%(read)d read, %(indexed)d indexed, %(skipped)d skipped, %(failed)d failed, %(slices_done)d slices in %(elapsed).1fs' % stats
+    for number, error in sorted(reindex.slice_errors.iteritems()):
+        print >> sys.stderr, 'Slice %d not copied: %s' % (number, error)
+    return 1 if stats['failed'] or stats['slices_failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
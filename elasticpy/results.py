@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+'''
+@author Luke Campbell <LCampbell@ASAScience.com>
+@file results
+@date 10/17/26 20:40
+@description Search results whose hit sources are decoded when they are read
+'''
+import re
+
+# Everything up to the next brace outside of a json string
+_brace = re.compile(r'(?:[^"{}]+|"[^"\\]*(?:\\.[^"\\]*)*")*([{}])')
+_marker = '"_source":'
+
+
+def _scan_end(text, begin):
+    depth = 0
+    for match in _brace.finditer(text, begin):
+        if match.group(1) == '{':
+            depth += 1
+        else:
+            depth -= 1
+            if not depth:
+                return match.end()
+    return None
+
+
+def _object_end(text, begin):
+    '''
+    Returns the position after the object starting at begin.
+    Braces are matched by counting, which is only right if none of them is inside a string:
+    that's checked on the object's strings and the object is tokenized otherwise.
+    '''
+    depth = 0
+    position = begin
+    while True:
+        close = text.find('}', position)
+        if close == -1:
+            return _scan_end(text, begin)
+        depth += text.count('{', position, close) - 1
+        position = close + 1
+        if not depth:
+            break
+    body = text[begin:position]
+    if '\\' in body:
+        # Escaped backslashes first so that what's left of every \\" is an escaped quote
+        body = body.replace('\\\\', '').replace('\\"', '')
+    strings = ''.join(body.split('"')[1::2])
+    if '{' in strings or '}' in strings:
+        return _scan_end(text, begin)
+    return position
+
+
+def split_sources(text):
+    '''
+    Cuts the _source objects out of a search response.
+    Returns the response with every _source replaced by its position in the list of sources, and the list of raw sources.
+    > split_sources('{"hits":{"hits":[{"_id":"1","_source":{"user":"kimchy"}}]}}')
+      ('{"hits":{"hits":[{"_id":"1","_source":0}]}}', ['{"user":"kimchy"}'])
+    '''
+    skeleton = list()
+    sources = list()
+    position = 0
+    start = text.find(_marker)
+    while start != -1:
+        begin = start + len(_marker)
+        while text[begin:begin + 1].isspace():
+            begin += 1
+        # Only a key of an object, not the same characters inside a string
+        before = start - 1
+        while before > 0 and text[before].isspace():
+            before -= 1
+        if text[begin:begin + 1] != '{' or text[before:before + 1] not in ('{', ','):
+            start = text.find(_marker, begin)
+            continue
+        end = _object_end(text, begin)
+        if end is None:
+            break
+        skeleton.append(text[position:begin])
+        skeleton.append(str(len(sources)))
+        sources.append(text[begin:end])
+        position = end
+        start = text.find(_marker, position)
+    skeleton.append(text[position:])
+    return ''.join(skeleton), sources
+
+
+class ElasticHit(object):
+    '''
+    A search hit holding its _source as the raw json of the response, decoded the first time source is read.
+    Hits also support the dict style access of decoded responses: hit['_id'], hit['_source'], hit.get('sort').
+    '''
+    __slots__ = ('index', 'type', 'id', 'score', 'sort', 'fields', 'highlight', 'raw_source', '_source', '_codec', '_encoding')
+
+    def __init__(self, hit, raw_source, codec, encoding=None):
+        self.index = hit.get('_index')
+        self.type = hit.get('_type')
+        self.id = hit.get('_id')
+        self.score = hit.get('_score')
+        self.sort = hit.get('sort')
+        self.fields = hit.get('fields')
+        self.highlight = hit.get('highlight')
+        self.raw_source = raw_source
+        self._source = None
+        self._codec = codec
+        self._encoding = encoding
+
+    @property
+    def source(self):
+        if self._source is None and self.raw_source is not None:
+            self._source = self._codec.loads(self.raw_source, encoding=self._encoding)
+        return self._source
+
+    _keys = {'_index': 'index', '_type': 'type', '_id': 'id', '_score': 'score', '_source': 'source', 'sort': 'sort', 'fields': 'fields', 'highlight': 'highlight'}
+
+    def __getitem__(self, key):
+        value = getattr(self, self._keys[key])
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __repr__(self):
+        return '<ElasticHit %s/%s/%s>' % (self.index, self.type, self.id)
+
+
+class ElasticResults(object):
+    '''
+    A search response whose hits are ElasticHits.
+    The response is decoded without the hit sources, which are only decoded when a hit's source is read.
+    This trades CPU for fewer live objects: cutting the sources out is done in python and costs more than
+    decoding the whole response with a C codec (2-3x with ujson or simplejson, see benchmarks/results_bench.py),
+    even when no source is read. What it saves is holding every decoded document at once.
+    To spend less time decoding, ask for less: source(include=[...]) or fields(...) shrink the response itself.
+
+    > results = ElasticSearch().source(include=['user','date']).search_results('twitter','tweet',query)
+    > results.total, len(results)
+    > for hit in results:
+    >     print hit.id, hit.source['user']
+    '''
+    __slots__ = ('response', 'total', 'max_score', 'took', 'timed_out', 'hits')
+
+    def __init__(self, text, codec, encoding=None):
+        skeleton, sources = split_sources(text)
+        response = codec.loads(skeleton, encoding=encoding) if skeleton else {'error': 'Empty response'}
+        hits = response.get('hits', {})
+        self.response = response
+        self.total = hits.get('total', 0)
+        self.max_score = hits.get('max_score')
+        self.took = response.get('took')
+        self.timed_out = response.get('timed_out')
+        self.hits = list()
+        for hit in hits.pop('hits', []):
+            marker = hit.get('_source')
+            raw_source = sources[marker] if isinstance(marker, int) and not isinstance(marker, bool) else None
+            self.hits.append(ElasticHit(hit, raw_source, codec, encoding))
+
+    def __iter__(self):
+        return iter(self.hits)
+
+    def __len__(self):
+        return len(self.hits)
+
+    def __getitem__(self, position):
+        return self.hits[position]
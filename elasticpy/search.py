@@ -5,8 +5,29 @@
 @date 05/24/12 09:30
 @description Class for searching and interfacing with ElasticSearch
 '''
+import time
 
 from connection import ElasticConnection
+from nodepool import parse_node
+from template import ElasticTemplate
+from optimize import optimize_query, optimize_filter
+from bulk import ElasticBulk, chunk_actions, parallel_bulk
+from fanout import sort_orders, merge_responses
+from workers import imap_bounded
+from pager import ElasticPager
+from results import ElasticResults
+
+
+class ElasticScrollError(IOError):
+    '''
+    Raised when a scroll or scan can't be continued (e.g. the index is missing or the scroll context expired),
+    status_code is the HTTP status (0 for a connection error) and error the error of the response
+    '''
+
+    def __init__(self, status_code, response):
+        self.status_code = status_code
+        self.error = response.get('error', response) if isinstance(response, dict) else response
+        IOError.__init__(self, 'Scroll failed with HTTP %s: %s' % (status_code, self.error))
 
 
 class ElasticSearch(object):
@@ -14,14 +35,34 @@ class ElasticSearch(object):
     ElasticSearch wrapper for python.
     Uses simple HTTP queries (RESTful) with json to provide the interface.
     '''
+    connection_class = ElasticConnection
+
+    def __init__(self, host='localhost',port='9200',timeout=None,verbose=False, encoding=None, nodes=None, selector='round_robin', codec=None, compression=None, cache=None, coalesce=False, metrics=None):
+        '''
+        nodes is an optional list of 'host:port' strings or (host, port) tuples, requests are spread across them
+        using the selector ('round_robin' or 'least_in_flight') and retried on another node after a connection error.
+        > search = ElasticSearch(nodes=['es1:9200','es2:9200','es3:9200'])
 
-    def __init__(self, host='localhost',port='9200',timeout=None,verbose=False, encoding=None):
+        compression is 'gzip' or 'deflate' to compress large request bodies, see ElasticConnection
+        cache is an ElasticCache holding the responses of search_advanced and search_index_advanced
+        coalesce shares one request between identical concurrent searches, see ElasticConnection
+        metrics is an ElasticMetrics timing every request, see metrics.py
+        '''
+        if nodes:
+            host, port = parse_node(nodes[0])
         self.host = host
         self.port = port
+        self.nodes = nodes
+        self.selector = selector
         self.params = None
         self.verbose = verbose
         self.timeout = timeout
-        self.session = ElasticConnection(timeout=timeout,encoding=encoding)
+        self.cache = cache
+        self.optimizing = False
+        self.optimize_debug = False
+        self.tracker = None
+        self.slowlog = None
+        self.session = self.connection_class(timeout=timeout,encoding=encoding,host=host,port=port,nodes=nodes,selector=selector,codec=codec,compression=compression,coalesce=coalesce,metrics=metrics)
 
     def timeout(self, value):
         '''
@@ -47,6 +88,35 @@ class ElasticSearch(object):
         self.params['filter'].update(efilter)
         return self
 
+    def optimized(self, debug=False):
+        '''
+        Rewrites queries and filters into cheaper equivalent forms before they are sent, see optimize.py
+        With debug every query and filter is printed before and after.
+        '''
+        self.optimizing = True
+        self.optimize_debug = debug
+        return self
+
+    def tracking(self, tracker):
+        '''
+        Records the filters of every search in tracker, an ElasticFilterTracker
+        > tracker = ElasticFilterTracker()
+        > search = ElasticSearch().tracking(tracker)
+        '''
+        self.tracker = tracker
+        return self
+
+    def slow_log(self, slowlog):
+        '''
+        Records the searches slower than the threshold of slowlog, an ElasticSlowLog.
+        Every search request is timed (each _msearch chunk, fanout index and scroll page on its own) except the streaming searches,
+        search_advanced_stream and search_index_stream, whose time depends on how fast the caller reads the hits.
+        > slowlog = ElasticSlowLog(threshold=0.25)
+        > search = ElasticSearch().slow_log(slowlog)
+        '''
+        self.slowlog = slowlog
+        return self
+
     def size(self,value):
         '''
         The number of hits to return. Defaults to 10
@@ -94,6 +164,37 @@ class ElasticSearch(object):
 
         return self
 
+    def fields(self, *names):
+        '''
+        http://www.elasticsearch.org/guide/reference/api/search/fields.html
+        Returns only the given stored (or _source) fields of every hit in the hit's fields instead of the whole _source.
+        With no names no fields are returned, hits only carry their _id.
+        > ElasticSearch().fields('user','date').search_advanced('twitter','tweet',query)
+        '''
+        if not self.params:
+            self.params = dict()
+        self.params['fields'] = list(names)
+        return self
+
+    def source(self, include=None, exclude=None):
+        '''
+        Filters the _source of every hit down to the fields matching include and not matching exclude (lists of field names or wildcard patterns),
+        source(False) drops _source altogether.
+        > ElasticSearch().source(include=['user','obj.*'], exclude=['*.description']).search_advanced('twitter','tweet',query)
+        '''
+        if not self.params:
+            self.params = dict()
+        if include is False:
+            self.params['_source'] = False
+            return self
+        projection = dict()
+        if include is not None:
+            projection['include'] = list(include)
+        if exclude is not None:
+            projection['exclude'] = list(exclude)
+        self.params['_source'] = projection
+        return self
+
     @staticmethod
     def search(index,itype,key,query,host='localhost',port='9200'):
         return ElasticSearch(host=host,port=port).search_simple(index,itype,key,query)
@@ -106,7 +207,7 @@ class ElasticSearch(object):
             query_header.update(self.params)
         if self.verbose:
             print query_header
-        response = request.post(url,query_header)
+        response = self._post_logged(url,query_header)
         return response
 
     def search_simple(self, index,itype, key, search_term):
@@ -118,7 +219,9 @@ class ElasticSearch(object):
         '''
         request = self.session
         url = 'http://%s:%s/%s/%s/_search?q=%s:%s' % (self.host,self.port,index,itype,key,search_term)
+        started = time.time()
         response = request.get(url)
+        self._log(url, {'q': '%s:%s' % (key, search_term)}, started, response)
 
         return response
 
@@ -132,16 +235,283 @@ class ElasticSearch(object):
         '''
         request = self.session
         url = 'http://%s:%s/%s/%s/_search' % (self.host,self.port,index,itype)
-        if self.params:
-            query_header = dict(query=query, **self.params)
+        query_header = self._query_header(query)
+        if self.verbose:
+            print query_header
+        response = self._post_search(url,index,query_header)
+
+        return response
+
+    def search_results(self, index, itype, query):
+        '''
+        Same as search_advanced but returns ElasticResults, whose hits keep their _source undecoded until it's read.
+        That saves memory rather than time, see ElasticResults. itype may be None to search the whole index. The cache is not used.
+        > for hit in ElasticSearch().size(100).search_results('twitter','tweet',query):
+        >     print hit.id, hit.score
+        '''
+        if itype:
+            url = 'http://%s:%s/%s/%s/_search' % (self.host,self.port,index,itype)
         else:
-            query_header = dict(query=query)
+            url = 'http://%s:%s/%s/_search' % (self.host,self.port,index)
+        query_header = self._query_header(query)
+        if self.verbose:
+            print query_header
+        started = time.time()
+        text = self.session.post_text(url,query_header)
+        elapsed = time.time() - started
+        results = ElasticResults(text, self.session.codec, self.session.encoding)
+        if self.slowlog is not None:
+            self.slowlog.record(url, query_header, elapsed, results.response)
+        return results
+
+    def search_advanced_stream(self, index, itype, query):
+        '''
+        Same as search_advanced but yields the hits one at a time as the response is read instead of decoding the whole response.
+        Requires ijson to keep memory bounded by a single hit.
+        > for hit in ElasticSearch().size(10000).search_advanced_stream('twitter','posts',query):
+        >     print hit['_source']
+        '''
+        url = 'http://%s:%s/%s/%s/_search' % (self.host,self.port,index,itype)
+        query_header = self._query_header(query)
         if self.verbose:
             print query_header
-        response = request.post(url,query_header)
+        return self.session.stream(url,query_header)
+
+    def _query_header(self, query):
+        header = self._search_body(query)
+        if self.tracker is not None:
+            self.tracker.track(header)
+        return header
+
+    def _search_body(self, query):
+        if self.optimizing:
+            query = optimize_query(query, self.optimize_debug)
+        header = dict(query=query, **(self.params or {}))
+        if self.optimizing and 'filter' in header:
+            header['filter'] = optimize_filter(header['filter'], self.optimize_debug)
+        return header
+
+    def _post_search(self, url, index, content):
+        '''
+        Posts a search, answering it from the cache when there is one
+        '''
+        request = self.session
+        if self.cache is None:
+            return self._post_logged(url,content)
+        key = self.cache.key(url, content)
+        response = self.cache.get(key)
+        if response is not None:
+            return response
+        response = self._post_logged(url,content)
+        if request.status_code == 200:
+            self.cache.put(key, index, response, request.response_size)
+        return response
 
+    def _post_logged(self, url, content):
+        if self.slowlog is None:
+            return self.session.post(url,content)
+        started = time.time()
+        response = self.session.post(url,content)
+        self.slowlog.record(url, content, time.time() - started, response)
         return response
 
+    def _log(self, url, content, started, response):
+        if self.slowlog is not None:
+            self.slowlog.record(url, content, time.time() - started, response)
+
+    def _invalidate(self, index):
+        if self.cache is not None:
+            self.cache.invalidate(index)
+
+    def scroll(self, index, itype=None, query=None, scroll='5m', size=None):
+        '''
+        http://www.elasticsearch.org/guide/reference/api/search/scroll.html
+        Yields every hit matching the query, fetching them a page (size hits) at a time through a scroll context kept alive for scroll between pages.
+        Hits come back in the order of the search (sort applies). The scroll context is cleared when the generator is exhausted or closed.
+        ElasticScrollError is raised if the search or any page fails, so a walk never ends early without notice.
+
+        > for hit in ElasticSearch().scroll('twitter','tweet',ElasticQuery.match_all(),scroll='1m',size=500):
+        >     ...
+        '''
+        return self._scroll(index, itype, query, scroll, size)
+
+    def scan(self, index, itype=None, query=None, scroll='5m', size=None):
+        '''
+        http://www.elasticsearch.org/guide/reference/api/search/search-type.html
+        Same as scroll with search_type=scan: hits are not scored or sorted which makes it the cheapest way to walk a whole index.
+        size is per shard, so every page holds up to size * number_of_shards hits.
+        '''
+        return self._scroll(index, itype, query, scroll, size, search_type='scan')
+
+    def _scroll(self, index, itype, query, scroll, size, search_type=None):
+        request = self.session
+        if itype:
+            url = 'http://%s:%s/%s/%s/_search?scroll=%s' % (self.host, self.port, index, itype, scroll)
+        else:
+            url = 'http://%s:%s/%s/_search?scroll=%s' % (self.host, self.port, index, scroll)
+        if search_type:
+            url += '&search_type=%s' % search_type
+        content = self._query_header(query or {'match_all': {}})
+        if size is not None:
+            content['size'] = size
+        if self.verbose:
+            print content
+        response = self._post_logged(url, content)
+        if request.status_code != 200 or '_scroll_id' not in response:
+            raise ElasticScrollError(request.status_code, response)
+        scroll_id = response['_scroll_id']
+        hits = response.get('hits', {}).get('hits', [])
+        try:
+            while True:
+                for hit in hits:
+                    yield hit
+                url = 'http://%s:%s/_search/scroll?scroll=%s' % (self.host, self.port, scroll)
+                started = time.time()
+                response = request.post(url, str(scroll_id))
+                self._log(url, {'scroll': scroll}, started, response)
+                if request.status_code != 200 or 'hits' not in response:
+                    raise ElasticScrollError(request.status_code, response)
+                scroll_id = response.get('_scroll_id', scroll_id)
+                hits = response['hits']['hits']
+                if not hits:
+                    break
+        finally:
+            if scroll_id:
+                request.delete('http://%s:%s/_search/scroll/%s' % (self.host, self.port, scroll_id))
+
+    def msearch(self, searches, chunk_size=100):
+        '''
+        http://www.elasticsearch.org/guide/reference/api/multi-search.html
+        Runs several searches in one round trip and returns their responses in the same order.
+        searches is a list of (index, itype, query) or (index, itype, query, params) tuples, itype may be None to search the whole index
+        and params (size, sort, ...) are applied on top of this instance's params.
+        Lists longer than chunk_size are sent as several _msearch requests.
+
+        > ElasticSearch().size(5).msearch([('twitter','tweet',ElasticQuery.term(user='kimchy')), ('blog',None,ElasticQuery.match_all(),{'size':1})])
+          [{... hits ...}, {... hits ...}]
+        '''
+        request = self.session
+        url = 'http://%s:%s/_msearch' % (self.host, self.port)
+        responses = list()
+        for start in xrange(0, len(searches), chunk_size):
+            chunk = searches[start:start + chunk_size]
+            body = self._msearch_body(chunk)
+            started = time.time()
+            response = request.post_raw(url, body)
+            self._log(url, body, started, response)
+            if 'responses' in response:
+                responses.extend(response['responses'])
+            else:
+                responses.extend([response] * len(chunk))
+        return responses
+
+    def _msearch_body(self, searches):
+        lines = list()
+        for search in searches:
+            index, itype, query = search[:3]
+            header = {'index': index}
+            if itype:
+                header['type'] = itype
+            content = self._query_header(query)
+            if len(search) > 3 and search[3]:
+                content.update(search[3])
+            lines.append(self.session.encode(header))
+            lines.append(self.session.encode(content))
+        body = '\n'.join(lines) + '\n'
+        if self.verbose:
+            print body
+        return body
+
+    def search_fanout(self, indexes, query, itype=None, thread_count=8, queue_size=8, timeout=None, shard_timeout=None):
+        '''
+        Searches every index of indexes concurrently on thread_count worker threads and returns the global top hits as one response.
+        Hits are merged with a k-way heap on _score, or on the sort keys when sort or sorted is active, so only size hits
+        (from_offset applies to the merged order) are returned with totals summed across the indexes.
+
+        timeout - seconds to wait for each index's response, defaults to this instance's timeout
+        shard_timeout - search timeout ('500ms') within each shard, shards that run over return the hits found so far
+
+        Indexes that fail are left out of the merge and listed in the response's failures as {'index': index, 'error': message}.
+        > search = ElasticSearch().size(20).sorted(ElasticSort().sort('date','desc'))
+        > response = search.search_fanout(['tenant-%d' % i for i in xrange(300)], ElasticQuery.term(status='open'))
+        > response['hits']['hits'], response['failures']
+        '''
+        indexes = list(indexes)
+        content = self._query_header(query)
+        offset = content.pop('from', 0) or 0
+        size = content.get('size', 10)
+        content['size'] = offset + size
+        if shard_timeout is not None:
+            content['timeout'] = shard_timeout
+        orders = sort_orders(content.get('sort'))
+        if self.verbose:
+            print content
+        body = self.session.encode(content)
+        if timeout is None:
+            timeout = self.timeout
+
+        def fetch(connection, index):
+            if itype:
+                url = 'http://%s:%s/%s/%s/_search' % (self.host, self.port, index, itype)
+            else:
+                url = 'http://%s:%s/%s/_search' % (self.host, self.port, index)
+            started = time.time()
+            response = connection.post_raw(url, body)
+            self._log(url, body, started, response)
+            if connection.status_code != 200 or 'error' in response:
+                raise IOError(response.get('error', 'HTTP %s' % connection.status_code))
+            return response
+
+        def connect():
+            return ElasticConnection(timeout=timeout, host=self.host, port=self.port, nodes=self.nodes, selector=self.selector, shared=False,
+                                     codec=self.session.codec, compression=self.session.compression, metrics=self.session.metrics)
+
+        responses = dict()
+        failures = list()
+        for ok, index, response in imap_bounded(fetch, indexes, thread_count, queue_size, connect):
+            if ok:
+                responses[index] = response
+            else:
+                failures.append({'index': index, 'error': str(response)})
+        # Merge in the order of indexes so ties don't depend on which index answered first
+        ordered = [responses[index] for index in indexes if index in responses]
+        return merge_responses(ordered, failures, orders, offset, size)
+
+    def pager(self, index, itype, query, tiebreaker):
+        '''
+        Returns an ElasticPager walking the search in pages of size hits with cursors instead of from_offset,
+        tiebreaker is a unique field added to the sort. itype may be None to search the whole index.
+        > pager = ElasticSearch().size(50).sort(date='desc').pager('twitter','tweet',query,'tweet_id')
+        > response, cursor = pager.page(request_cursor)
+        '''
+        return ElasticPager(self, index, itype, query, tiebreaker)
+
+    def compile(self, query):
+        '''
+        Compiles the search body for query, including the current params (size, sort, ...), into an ElasticTemplate.
+        Values are bound with ElasticTemplate.param placeholders when the template is searched.
+
+        > search = ElasticSearch().size(20)
+        > template = search.compile(ElasticQuery.term(user=ElasticTemplate.param('user')))
+        > search.search_template('twitter','tweet',template,user='kimchy')
+        '''
+        return ElasticTemplate(self._search_body(query), self.session.codec)
+
+    def search_template(self, index, itype, template, **values):
+        '''
+        Searches with a compiled template (see compile), itype may be None to search the whole index
+        '''
+        if itype:
+            url = 'http://%s:%s/%s/%s/_search' % (self.host,self.port,index,itype)
+        else:
+            url = 'http://%s:%s/%s/_search' % (self.host,self.port,index)
+        content = template.render(**values)
+        if self.tracker is not None:
+            self.tracker.track(template.tree, values)
+        if self.verbose:
+            print content
+        return self._post_search(url,index,content)
+
     def doc_create(self,index,itype,value):
         '''
         Creates a document
@@ -151,8 +521,34 @@ class ElasticSearch(object):
         if self.verbose:
             print value
         response = request.post(url,value)
+        self._invalidate(index)
         return response
 
+    def bulk(self, chunk_size=500, max_bytes=5242880, flush_interval=None):
+        '''
+        Returns a bulk indexer sharing this instance's connection,
+        with flush_interval it flushes from a thread of its own and gets a connection of its own
+        > bulk = ElasticSearch().bulk(chunk_size=1000)
+        > bulk.index('twitter','tweet',{'user':'kimchy'})
+        > bulk.flush()
+        '''
+        session = self.session
+        if flush_interval is not None:
+            session = ElasticConnection(timeout=self.timeout, host=self.host, port=self.port, nodes=self.nodes, selector=self.selector, shared=False,
+                                        codec=self.session.codec, compression=self.session.compression, metrics=self.session.metrics)
+        return ElasticBulk(host=self.host, port=self.port, chunk_size=chunk_size, max_bytes=max_bytes, flush_interval=flush_interval, session=session)
+
+    def bulk_parallel(self, actions, chunk_size=500, max_bytes=5242880, thread_count=4, queue_size=4):
+        '''
+        Submits encoded bulk actions in chunks across a pool of worker threads,
+        yields (ok, count, response) for every chunk as it completes.
+        > actions = (bulk_action('index','twitter','tweet',doc) for doc in documents)
+        > for ok, count, response in ElasticSearch().bulk_parallel(actions, thread_count=8):
+        >     ...
+        '''
+        chunks = chunk_actions(actions, chunk_size, max_bytes)
+        return parallel_bulk(chunks, self.host, self.port, self.timeout, thread_count, queue_size)
+
 
     def search_index_simple(self,index,key,search_term):
         '''
@@ -175,15 +571,22 @@ class ElasticSearch(object):
         '''
         request = self.session
         url = 'http://%s:%s/%s/_search' % (self.host, self.port, index)
-        if self.params:
-            content = dict(query=query, **self.params)
-        else:
-            content = dict(query=query)
+        content = self._query_header(query)
         if self.verbose:
             print content
-        response = request.post(url,content)
+        response = self._post_search(url,index,content)
         return response
 
+    def search_index_stream(self, index, query):
+        '''
+        Same as search_index_advanced but yields the hits one at a time as the response is read.
+        '''
+        url = 'http://%s:%s/%s/_search' % (self.host, self.port, index)
+        content = self._query_header(query)
+        if self.verbose:
+            print content
+        return self.session.stream(url,content)
+
 
     def index_create(self, index, number_of_shards=5,number_of_replicas=1):
         '''
@@ -210,6 +613,7 @@ class ElasticSearch(object):
         request = self.session
         url = 'http://%s:%s/%s' % (self.host, self.port, index)
         response = request.delete(url)
+        self._invalidate(index)
         return response
 
     def index_open(self, index):
@@ -234,6 +638,7 @@ class ElasticSearch(object):
         request = self.session
         url = 'http://%s:%s/%s/_close' % (self.host, self.port, index)
         response = request.post(url,None)
+        self._invalidate(index)
         return response
 
     def river_couchdb_create(self, index_name,index_type='',couchdb_db='', river_name='',couchdb_host='localhost', couchdb_port='5984',couchdb_user=None, couchdb_password=None, couchdb_filter=None,script=''):
@@ -322,6 +727,7 @@ class ElasticSearch(object):
         if self.verbose:
             print content
         response = request.put(url,content)
+        self._invalidate(index_name)
         return response
 
     @staticmethod
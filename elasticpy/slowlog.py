@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+'''
+@author Luke Campbell <LCampbell@ASAScience.com>
+@file slowlog
+@date 10/17/26 22:05
+@description Client side log of slow searches grouped by query shape
+'''
+import time
+import hashlib
+import simplejson
+from collections import deque
+
+from cache import canonical
+
+try:
+    from gevent.coros import RLock
+except ImportError:
+    from threading import RLock
+
+
+def shape(tree):
+    '''
+    The structure of a query with its literal values replaced by '?', field names are kept.
+    Lists of values collapse into one placeholder so term queries on 2 or 20 values have the same shape.
+    > shape({'bool': {'must': [{'term': {'user': 'kimchy'}}, {'terms': {'tag': ['a', 'b', 'c']}}]}})
+      {'bool': {'must': [{'term': {'user': '?'}}, {'terms': {'tag': ['?']}}]}}
+    '''
+    if isinstance(tree, dict):
+        return dict((key, shape(value)) for key, value in tree.iteritems())
+    if isinstance(tree, (list, tuple)):
+        shapes = [shape(value) for value in tree]
+        if all(not isinstance(value, (dict, list)) for value in shapes):
+            return ['?'] if shapes else []
+        return shapes
+    return '?'
+
+
+def _digest(tree):
+    return hashlib.sha1(canonical(tree)).hexdigest()
+
+
+def fingerprint(tree):
+    '''
+    Fingerprint of the shape of a query, equal for queries that only differ by their values
+    '''
+    return _digest(shape(tree))
+
+
+def _target(url):
+    '''
+    (index, itype) searched by url, itype is None for index wide searches
+    '''
+    path = url.split('?', 1)[0].split('/', 3)[-1]
+    segments = list()
+    for segment in path.split('/'):
+        # Index and type names can't start with an underscore, API names (_search, _msearch) do
+        if segment.startswith('_'):
+            break
+        if segment:
+            segments.append(segment)
+    return (segments[0] if segments else None), (segments[1] if len(segments) > 1 else None)
+
+
+class ElasticSlowLog(object):
+    '''
+    Records every search slower than threshold seconds with the fingerprint of its query shape (see shape),
+    the index and type searched, the round trip time, the server's took and the number of hits,
+    and aggregates them per fingerprint to find the query shapes worth optimizing.
+
+    max_entries - the most recent slow searches kept
+    max_shapes - shapes kept in the aggregate, the least costly shape is dropped to make room
+    callback - called with every entry as it's recorded, e.g. to log it
+
+    > slowlog = ElasticSlowLog(threshold=0.2)
+    > search = ElasticSearch().slow_log(slowlog)
+    > ... searches ...
+    > slowlog.top(5)
+      [{'fingerprint': '9f1c...', 'count': 31, 'total': 14.2, 'max': 1.9, 'took': 12.8, 'hits': 120442,
+        'targets': ['twitter/tweet'], 'shape': {'query': {'query_string': {'query': '?'}}, 'size': '?'}}, ...]
+    '''
+
+    def __init__(self, threshold=0.5, max_entries=1000, max_shapes=1000, callback=None):
+        self.threshold = threshold
+        self.max_shapes = max_shapes
+        self.callback = callback
+        self.entries = deque(maxlen=max_entries)
+        self.shapes = dict() # fingerprint -> aggregate
+        self.searches = 0
+        self.slow = 0
+        self._lock = RLock()
+
+    def record(self, url, content, elapsed, response):
+        '''
+        Logs a search if elapsed is over the threshold, content is the search body as a tree or encoded json,
+        an _msearch body (one json document per line) is logged as the list of its documents
+        '''
+        if elapsed < self.threshold:
+            with self._lock:
+                self.searches += 1
+            return None
+        if isinstance(content, basestring):
+            lines = content.strip().split('\n')
+            content = simplejson.loads(lines[0]) if len(lines) == 1 else [simplejson.loads(line) for line in lines]
+        index, itype = _target(url)
+        hits = None
+        took = None
+        if isinstance(response, dict):
+            hits = response.get('hits', {}).get('total')
+            if response.get('took') is not None:
+                took = response['took'] / 1000.0
+        tree = shape(content)
+        entry = {
+            'time': time.time(),
+            'fingerprint': _digest(tree),
+            'index': index,
+            'type': itype,
+            'elapsed': elapsed,
+            'took': took,
+            'hits': hits,
+            'query': content
+        }
+        with self._lock:
+            self.searches += 1
+            self.slow += 1
+            self.entries.append(entry)
+            self._aggregate(entry, tree)
+        if self.callback is not None:
+            self.callback(entry)
+        return entry
+
+    def _aggregate(self, entry, tree):
+        stats = self.shapes.get(entry['fingerprint'])
+        if stats is None:
+            if len(self.shapes) >= self.max_shapes:
+                cheapest = min(self.shapes, key=lambda key: self.shapes[key]['total'])
+                del self.shapes[cheapest]
+            stats = self.shapes[entry['fingerprint']] = {
+                'fingerprint': entry['fingerprint'], 'shape': tree, 'count': 0, 'total': 0.0, 'max': 0.0, 'took': 0.0, 'hits': 0, 'targets': set()
+            }
+        stats['count'] += 1
+        stats['total'] += entry['elapsed']
+        stats['max'] = max(stats['max'], entry['elapsed'])
+        stats['took'] += entry['took'] or 0.0
+        stats['hits'] += entry['hits'] or 0
+        stats['targets'].add('/'.join(filter(None, (entry['index'], entry['type']))))
+
+    def top(self, count=10, by='total'):
+        '''
+        The costliest query shapes, by total (time spent), max, count or took
+        '''
+        with self._lock:
+            shapes = [dict(stats, targets=sorted(stats['targets'])) for stats in self.shapes.itervalues()]
+        shapes.sort(key=lambda stats: stats[by], reverse=True)
+        return shapes[:count]
+
+    def stats(self):
+        with self._lock:
+            return {'searches': self.searches, 'slow': self.slow, 'shapes': len(self.shapes), 'entries': len(self.entries)}
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.shapes.clear()
+            self.searches = 0
+            self.slow = 0
@@ -57,3 +57,30 @@ class ElasticSort(list):
         self.append({'track_scores': True})
 
         return self
+
+
+def sort_keys(spec):
+    '''
+    Returns (field, descending) for every key of a sort spec, in the order of the hits' sort values.
+    spec is an ElasticSort or the list built by ElasticSearch.sort.
+    > sort_keys(ElasticSort().sort('date', 'desc').sort('name'))
+      [('date', True), ('name', False)]
+    '''
+    if not spec:
+        return []
+    if not isinstance(spec, (list, tuple)):
+        spec = [spec]
+    keys = list()
+    for item in spec:
+        if not isinstance(item, dict):
+            keys.append((item, item == '_score'))
+            continue
+        field, options = item.items()[0]
+        if field == 'track_scores':
+            continue
+        order = options.get('order') if isinstance(options, dict) else options
+        if order is None:
+            keys.append((field, field == '_score'))
+        else:
+            keys.append((field, order == 'desc'))
+    return keys
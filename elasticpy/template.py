@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+'''
+@author Luke Campbell <LCampbell@ASAScience.com>
+@file template
+@date 10/17/26 16:40
+@description Precompiled query templates
+'''
+from codec import get_codec
+
+
+class ElasticParam(object):
+    '''
+    Placeholder for a value bound when an ElasticTemplate is rendered
+    '''
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return 'ElasticParam(%r)' % self.name
+
+
+class ElasticTemplate(object):
+    '''
+    A query (or whole search body) encoded once, with the placeholders left as gaps between pre-encoded fragments.
+    Rendering encodes only the bound values and joins them with the fragments, the tree is never rebuilt or re-encoded.
+
+    > user = ElasticTemplate.param('user')
+    > template = ElasticTemplate(ElasticQuery.bool(must=[ElasticQuery.term(user=user), ElasticQuery.range('age', from_value=ElasticTemplate.param('age'))]))
+    > template.render(user='kimchy', age=18)
+      '{"bool":{"must":[{"term":{"user":"kimchy"}},{"range":{"age":{"from":18}}}]}}'
+
+    Placeholders can only stand for values, not keys.
+    '''
+    _marker = '__elasticpy_param_%d__'
+
+    def __init__(self, tree, codec=None):
+        self.codec = codec or get_codec()
+        self.tree = tree
+        self._params = list()
+        encoded = self.codec.dumps(self._substitute(tree))
+        # The encoder decides the order of the keys, so the placeholders are ordered by where their markers ended up
+        positions = list()
+        for i, name in enumerate(self._params):
+            marker = '"%s"' % (self._marker % i)
+            if encoded.count(marker) != 1:
+                raise ValueError('Placeholder %s can not be located in the encoded template' % name)
+            positions.append((encoded.index(marker), len(marker), name))
+        positions.sort()
+        self.names = [name for position, length, name in positions]
+        self.fragments = list()
+        start = 0
+        for position, length, name in positions:
+            self.fragments.append(encoded[start:position])
+            start = position + length
+        self.fragments.append(encoded[start:])
+
+    @staticmethod
+    def param(name):
+        return ElasticParam(name)
+
+    def _substitute(self, value):
+        # Copies the tree replacing every placeholder with a unique marker string
+        if isinstance(value, ElasticParam):
+            self._params.append(value.name)
+            return self._marker % (len(self._params) - 1)
+        if isinstance(value, dict):
+            return dict((k, self._substitute(v)) for k, v in value.iteritems())
+        if isinstance(value, (list, tuple)):
+            return [self._substitute(v) for v in value]
+        return value
+
+    def _encode(self, value):
+        if value is True:
+            return 'true'
+        if value is False:
+            return 'false'
+        if type(value) in (int, long):
+            return str(value)
+        return self.codec.dumps(value)
+
+    def render(self, **values):
+        '''
+        Returns the encoded body with values bound to the placeholders
+        '''
+        fragments = self.fragments
+        parts = [fragments[0]]
+        for i, name in enumerate(self.names):
+            if name not in values:
+                raise KeyError('No value bound to %s' % name)
+            parts.append(self._encode(values[name]))
+            parts.append(fragments[i + 1])
+        return ''.join(parts)
@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+'''
+@author Luke Campbell <LCampbell@ASAScience.com>
+@file tracker
+@date 10/17/26 19:05
+@description Client side statistics on how often the same filters are sent
+'''
+import hashlib
+from collections import OrderedDict
+
+from cache import canonical
+from template import ElasticParam
+from filter import uncacheable
+
+try:
+    from gevent.coros import RLock
+except ImportError:
+    from threading import RLock
+
+
+def _strip(value, values=None):
+    # The cache hints don't change which documents a filter matches,
+    # template placeholders are replaced by their bound value or '?' when unbound
+    if isinstance(value, ElasticParam):
+        return values[value.name] if values and value.name in values else '?'
+    if isinstance(value, dict):
+        return dict((k, _strip(v, values)) for k, v in value.iteritems() if k not in ('_cache', '_cache_key'))
+    if isinstance(value, (list, tuple)):
+        return [_strip(v, values) for v in value]
+    return value
+
+
+def _hint(efilter):
+    body = efilter.values()[0]
+    if isinstance(body, dict):
+        return body.get('_cache')
+    return None
+
+
+def _children(value):
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return value
+    return [value]
+
+
+class ElasticFilterTracker(object):
+    '''
+    Fingerprints every filter (and every filter nested in and, or, not, bool and filtered queries) sent by the searches it tracks,
+    and reports which ones repeat often enough to be worth the _cache hint, and which cached ones are never reused.
+
+    max_entries - the least recently seen fingerprint is forgotten beyond this many fingerprints
+
+    > tracker = ElasticFilterTracker()
+    > search = ElasticSearch().tracking(tracker)
+    > ... searches ...
+    > tracker.report(min_count=100, top=10)
+      [{'fingerprint': '1a2b...', 'count': 5120, 'share': 0.85, 'cache': None, 'worth_caching': True, 'filter': {'term': {'status': 'active'}}}, ...]
+    '''
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self.entries = OrderedDict() # fingerprint -> [count, cache hint, filter]
+        self.searches = 0
+        self.filters = 0
+        self.evictions = 0
+        self._lock = RLock()
+
+    def fingerprint(self, efilter, values=None):
+        '''
+        Structural fingerprint of a filter, equal for filters that only differ by key order or cache hints.
+        values are bound to the template placeholders of efilter.
+        '''
+        return hashlib.sha1(canonical(_strip(efilter, values))).hexdigest()
+
+    def track(self, content, values=None):
+        '''
+        Records the filters of a search body ({'query': ..., 'filter': ...}),
+        values are bound to its placeholders when content is the tree of an ElasticTemplate
+        '''
+        found = list()
+        if isinstance(content, dict):
+            self._walk_query(content.get('query'), found)
+            self._walk_filter(content.get('filter'), found)
+        keys = [self.fingerprint(efilter, values) for efilter in found]
+        with self._lock:
+            self.searches += 1
+            for key, efilter in zip(keys, found):
+                self._record(key, efilter, values)
+
+    def _record(self, key, efilter, values=None):
+        self.filters += 1
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            entry = [0, None, _strip(efilter, values)]
+        entry[0] += 1
+        entry[1] = _hint(efilter)
+        self.entries[key] = entry
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def _walk_query(self, query, found):
+        if not isinstance(query, dict) or len(query) != 1:
+            return
+        name, body = query.items()[0]
+        if not isinstance(body, dict):
+            return
+        if name in ('filtered', 'constant_score'):
+            self._walk_query(body.get('query'), found)
+            self._walk_filter(body.get('filter'), found)
+        elif name == 'bool':
+            for occur in ('must', 'should', 'must_not'):
+                for clause in _children(body.get(occur)):
+                    self._walk_query(clause, found)
+
+    def _walk_filter(self, efilter, found):
+        if not isinstance(efilter, dict) or len(efilter) != 1:
+            return
+        found.append(efilter)
+        name, body = efilter.items()[0]
+        if name in ('and', 'or'):
+            children = body.get('filters') if isinstance(body, dict) else body
+        elif name == 'not':
+            children = body['filter'] if isinstance(body, dict) and 'filter' in body else body
+        elif name == 'bool' and isinstance(body, dict):
+            children = list()
+            for occur in ('must', 'should', 'must_not'):
+                children.extend(_children(body.get(occur)))
+        elif name in ('query', 'fquery'):
+            self._walk_query(body.get('query') if name == 'fquery' else body, found)
+            return
+        else:
+            return
+        for child in _children(children):
+            self._walk_filter(child, found)
+
+    def report(self, min_count=2, top=None):
+        '''
+        Returns the tracked filters, most frequent first.
+        worth_caching is True for filters seen at least min_count times that can take the hint (see filter.uncacheable);
+        a filter with cache True that isn't worth caching only fills the filter cache, one with cache False that is worth
+        caching is evaluated again on every search.
+        '''
+        with self._lock:
+            searches = self.searches or 1
+            entries = [{
+                'fingerprint': key,
+                'count': count,
+                'share': float(count) / searches,
+                'cache': hint,
+                'worth_caching': count >= min_count and efilter.keys()[0] not in uncacheable,
+                'filter': efilter
+            } for key, (count, hint, efilter) in self.entries.iteritems()]
+        entries.sort(key=lambda entry: entry['count'], reverse=True)
+        if top is not None:
+            entries = entries[:top]
+        return entries
+
+    def stats(self):
+        with self._lock:
+            return {
+                'searches': self.searches,
+                'filters': self.filters,
+                'fingerprints': len(self.entries),
+                'evictions': self.evictions
+            }
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.searches = 0
+            self.filters = 0
+            self.evictions = 0
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+'''
+@author Luke Campbell <LCampbell@ASAScience.com>
+@file workers
+@date 10/17/26 09:12
+@description Bounded worker thread pool
+'''
+import threading
+import Queue
+
+
+def imap_bounded(func, iterable, thread_count=4, queue_size=4, initializer=None):
+    '''
+    Applies func to every item of iterable on thread_count worker threads and yields (ok, item, result) in completion order.
+    At most thread_count + queue_size items are pulled from iterable before their results are consumed,
+    so a lazy iterable is never read far ahead of the caller.
+
+    initializer is called once in each worker thread and its return value is passed to func as the first argument,
+    it's used to give every worker its own connection:
+    > for ok, chunk, response in imap_bounded(lambda conn, chunk: conn.post_raw(url, chunk), chunks, initializer=ElasticConnection):
+    >     ...
+
+    If func raises, ok is False and result is the exception.
+    If initializer raises, every item given to that worker is yielded with ok False and the initializer's exception.
+    Closing the generator early drops the items not started yet and only waits for the ones in progress.
+    '''
+    tasks = Queue.Queue()
+    results = Queue.Queue()
+    done = object()
+
+    def worker():
+        state = failure = None
+        if initializer is not None:
+            try:
+                state = initializer()
+            except Exception as e:
+                failure = e
+        while True:
+            item = tasks.get()
+            if item is done:
+                return
+            if failure is not None:
+                results.put((False, item, failure))
+                continue
+            try:
+                if initializer is not None:
+                    result = func(state, item)
+                else:
+                    result = func(item)
+                results.put((True, item, result))
+            except Exception as e:
+                results.put((False, item, e))
+
+    threads = [threading.Thread(target=worker) for i in xrange(thread_count)]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    limit = thread_count + queue_size
+    pending = 0
+    source = iter(iterable)
+    exhausted = False
+    try:
+        while True:
+            while not exhausted and pending < limit:
+                try:
+                    tasks.put(source.next())
+                    pending += 1
+                except StopIteration:
+                    exhausted = True
+            if not pending:
+                break
+            outcome = results.get()
+            pending -= 1
+            yield outcome
+    finally:
+        while True:
+            try:
+                tasks.get_nowait()
+            except Queue.Empty:
+                break
+        for thread in threads:
+            tasks.put(done)
+        for thread in threads:
+            thread.join()
@@ -19,8 +19,16 @@ setup(
     keywords='elasticsearch search wrapper',
     packages=['elasticpy'],
     install_requires=[
-        'Requests>=0.12.1',
+        'Requests>=1.0',
         'simplejson==2.1.6'
     ],
+    extras_require={
+        'async': ['tornado>=4.1'],
+        'streaming': ['ijson'],
+        'fast': ['ujson']
+    },
+    entry_points={
+        'console_scripts': ['elasticpy-reindex = elasticpy.reindex:main']
+    },
 
 )
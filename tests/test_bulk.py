@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+'''
+@author Luke Campbell <LCampbell@ASAScience.com>
+@file test_bulk
+@date 10/18/26 17:00
+@description Tests for the buffered bulk indexer
+
+Usage:
+    python -m unittest discover tests
+'''
+import time
+import threading
+import unittest
+
+from elasticpy.bulk import ElasticBulk, bulk_action, chunk_actions
+
+
+class FakeSession(object):
+    '''
+    Stands in for ElasticConnection, answers every _bulk request with a successful item per action
+    '''
+
+    def __init__(self, fail=False):
+        self.bodies = list()
+        self.threads = list()
+        self.fail = fail
+
+    def post_raw(self, url, body):
+        self.bodies.append(body)
+        self.threads.append(threading.current_thread())
+        if self.fail:
+            raise IOError('node gone')
+        return {'items': [{'index': {'status': 201}} for i in xrange(body.count('\n') / 2)]}
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+class ElasticBulkTest(unittest.TestCase):
+
+    def test_flushes_on_chunk_size(self):
+        session = FakeSession()
+        bulk = ElasticBulk(chunk_size=2, session=session)
+        self.assertEqual(bulk.index('twitter', 'tweet', {'a': 1}), None)
+        self.assertNotEqual(bulk.index('twitter', 'tweet', {'a': 2}), None)
+        self.assertEqual(len(session.bodies), 1)
+        self.assertEqual(len(bulk), 0)
+
+    def test_interval_flushes_without_appends(self):
+        session = FakeSession()
+        bulk = ElasticBulk(flush_interval=0.05, session=session)
+        try:
+            bulk.index('twitter', 'tweet', {'a': 1})
+            self.assertTrue(wait_for(lambda: session.bodies))
+            self.assertEqual(session.bodies, [bulk_action('index', 'twitter', 'tweet', {'a': 1})])
+            self.assertNotEqual(session.threads[0], threading.current_thread())
+            self.assertEqual(len(bulk), 0)
+        finally:
+            bulk.close()
+
+    def test_close_stops_the_thread_and_flushes(self):
+        session = FakeSession()
+        bulk = ElasticBulk(flush_interval=60, session=session)
+        bulk.index('twitter', 'tweet', {'a': 1})
+        bulk.close()
+        self.assertFalse(bulk._timer.is_alive())
+        self.assertEqual(len(session.bodies), 1)
+        self.assertEqual(session.threads, [threading.current_thread()])
+
+    def test_with_block_closes(self):
+        session = FakeSession()
+        with ElasticBulk(flush_interval=60, session=session) as bulk:
+            bulk.delete('twitter', 'tweet', '1')
+        self.assertFalse(bulk._timer.is_alive())
+        self.assertEqual(session.bodies, [bulk_action('delete', 'twitter', 'tweet', doc_id='1')])
+
+    def test_interval_flush_errors_are_kept(self):
+        bulk = ElasticBulk(flush_interval=0.05, session=FakeSession(fail=True))
+        try:
+            bulk.index('twitter', 'tweet', {'a': 1})
+            self.assertTrue(wait_for(lambda: bulk.errors))
+            self.assertEqual(bulk.errors, [{'error': 'node gone'}])
+            self.assertTrue(bulk._timer.is_alive())
+        finally:
+            bulk._closed.set()
+
+
+class ChunkActionsTest(unittest.TestCase):
+
+    def test_bounds(self):
+        actions = ['x' * 10] * 7
+        self.assertEqual([len(chunk) for chunk in chunk_actions(actions, chunk_size=3)], [3, 3, 1])
+        self.assertEqual([len(chunk) for chunk in chunk_actions(actions, max_bytes=25)], [2, 2, 2, 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
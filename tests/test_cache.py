@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+'''
+@author Luke Campbell <LCampbell@ASAScience.com>
+@file test_cache
+@date 10/18/26 16:45
+@description Tests for the client side search result cache
+
+Usage:
+    python -m unittest discover tests
+'''
+import unittest
+
+from elasticpy import cache
+from elasticpy.cache import ElasticCache
+
+
+class FakeClock(object):
+    '''
+    Stands in for the time module in cache
+    '''
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+def response(total):
+    return {'took': 1, 'hits': {'total': total, 'hits': [{'_id': str(total), '_source': {'tags': ['a']}}]}}
+
+
+class ElasticCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self._time = cache.time
+        cache.time = self.clock
+
+    def tearDown(self):
+        cache.time = self._time
+
+    def test_key_ignores_key_order(self):
+        store = ElasticCache()
+        self.assertEqual(store.key('url', {'a': 1, 'b': {'c': 2, 'd': 3}}), store.key('url', {'b': {'d': 3, 'c': 2}, 'a': 1}))
+        self.assertNotEqual(store.key('url', {'a': 1}), store.key('other', {'a': 1}))
+
+    def test_least_recently_used_is_evicted(self):
+        store = ElasticCache(max_entries=2)
+        store.put('a', 'twitter', response(1), 10)
+        store.put('b', 'twitter', response(2), 10)
+        store.get('a')
+        store.put('c', 'twitter', response(3), 10)
+        self.assertEqual(store.get('b'), None)
+        self.assertEqual(store.get('a'), response(1))
+        self.assertEqual(store.get('c'), response(3))
+        self.assertEqual(store.stats(), {'hits': 3, 'misses': 1, 'evictions': 1, 'invalidations': 0, 'entries': 2, 'bytes': 20})
+
+    def test_entries_expire(self):
+        store = ElasticCache(ttl=60)
+        store.put('a', 'twitter', response(1), 10)
+        self.clock.now += 60
+        self.assertEqual(store.get('a'), response(1))
+        self.clock.now += 1
+        self.assertEqual(store.get('a'), None)
+        self.assertEqual(store.stats()['bytes'], 0)
+        self.assertEqual(store.stats()['entries'], 0)
+
+    def test_max_bytes(self):
+        store = ElasticCache(max_bytes=25)
+        store.put('a', 'twitter', response(1), 10)
+        store.put('b', 'twitter', response(2), 10)
+        store.put('c', 'twitter', response(3), 10)
+        self.assertEqual(store.get('a'), None)
+        self.assertEqual(store.stats()['bytes'], 20)
+        store.put('b', 'twitter', response(4), 5)
+        self.assertEqual(store.stats()['bytes'], 15)
+        self.assertEqual(store.get('b'), response(4))
+
+    def test_invalidate_by_index(self):
+        store = ElasticCache()
+        store.put('one', 'twitter', response(1), 10)
+        store.put('many', 'blog,twitter', response(2), 10)
+        store.put('all', '_all', response(3), 10)
+        store.put('other', 'blog', response(4), 10)
+        store.invalidate('twitter')
+        self.assertEqual([store.get(key) is not None for key in ('one', 'many', 'all', 'other')], [False, False, False, True])
+        self.assertEqual(store.stats()['invalidations'], 3)
+        self.assertEqual(store.stats()['bytes'], 10)
+        store.invalidate()
+        self.assertEqual(store.stats()['entries'], 0)
+
+    def test_responses_are_copied_in_and_out(self):
+        store = ElasticCache()
+        original = response(1)
+        store.put('a', 'twitter', original, 10)
+        original['hits']['hits'][0]['_source']['tags'].append('put')
+        first = store.get('a')
+        first['hits']['hits'].pop()
+        first['took'] = 99
+        self.assertEqual(store.get('a'), response(1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+'''
+@author Luke Campbell <LCampbell@ASAScience.com>
+@file test_connection
+@date 10/18/26 14:05
+@description Tests for failing requests over to other nodes
+
+Usage:
+    python -m unittest discover tests
+'''
+import socket
+import threading
+import unittest
+
+from elasticpy.connection import ElasticConnection
+
+
+class ClosingNode(object):
+    '''
+    A node that reads every request and closes the connection without answering
+    '''
+
+    def __init__(self):
+        self.requests = 0
+        self.socket = socket.socket()
+        self.socket.bind(('127.0.0.1', 0))
+        self.socket.listen(8)
+        self.port = self.socket.getsockname()[1]
+        thread = threading.Thread(target=self._serve)
+        thread.daemon = True
+        thread.start()
+
+    def _serve(self):
+        while True:
+            try:
+                client, address = self.socket.accept()
+            except socket.error:
+                return
+            client.recv(65536)
+            self.requests += 1
+            client.close()
+
+    def close(self):
+        self.socket.close()
+
+
+def _refused_port():
+    # A port nothing listens on
+    s = socket.socket()
+    s.bind(('127.0.0.1', 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+class FailoverTest(unittest.TestCase):
+
+    def setUp(self):
+        self.closing = ClosingNode()
+        self.other = ClosingNode()
+        self.nodes = [('127.0.0.1', self.closing.port), ('127.0.0.1', self.other.port)]
+
+    def tearDown(self):
+        self.closing.close()
+        self.other.close()
+
+    def test_post_received_by_a_node_is_not_sent_again(self):
+        connection = ElasticConnection(nodes=self.nodes, shared=False, timeout=5)
+        response = connection.post('http://localhost:9200/twitter/tweet/', {'user': 'kimchy'})
+        self.assertEqual(connection.status_code, 0)
+        self.assertTrue('error' in response)
+        self.assertEqual(self.closing.requests + self.other.requests, 1)
+        self.assertEqual(len(connection.pool.live), 1)
+
+    def test_idempotent_request_fails_over(self):
+        connection = ElasticConnection(nodes=self.nodes, shared=False, timeout=5)
+        connection.get('http://localhost:9200/twitter/tweet/1')
+        self.assertEqual((self.closing.requests, self.other.requests), (1, 1))
+
+    def test_refused_connection_fails_over(self):
+        nodes = [('127.0.0.1', _refused_port()), ('127.0.0.1', self.other.port)]
+        connection = ElasticConnection(nodes=nodes, shared=False, timeout=5)
+        connection.post('http://localhost:9200/twitter/tweet/', {'user': 'kimchy'})
+        self.assertEqual(self.other.requests, 1)
+        self.assertTrue(nodes[0] in connection.pool.dead)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+'''
+@author Luke Campbell <LCampbell@ASAScience.com>
+@file test_filter
+@date 10/18/26 15:05
+@description Tests for the filter cache hints
+
+Usage:
+    python -m unittest discover tests
+'''
+import unittest
+
+from elasticpy import ElasticFilter, ElasticQuery
+from elasticpy.tracker import ElasticFilterTracker
+
+
+class CacheHintsTest(unittest.TestCase):
+
+    def test_hints_on_cacheable_filters(self):
+        self.assertEqual(ElasticFilter.term('user', 'kimchy', cache=True), {'term': {'user': 'kimchy', '_cache': True}})
+        self.assertEqual(ElasticFilter.and_filter([ElasticFilter.term('a', 1)], cache_key='a'),
+                         {'and': {'filters': [{'term': {'a': 1}}], '_cache_key': 'a'}})
+        self.assertEqual(ElasticFilter.query(ElasticQuery.match_all(), cache=False),
+                         {'fquery': {'query': {'match_all': {}}, '_cache': False}})
+
+    def test_uncacheable_filters_reject_hints(self):
+        self.assertRaises(TypeError, ElasticFilter.exists, 'user', cache=True)
+        self.assertRaises(ValueError, ElasticFilter.missing('user').cached)
+        self.assertRaises(ValueError, ElasticFilter.ids(['1']).cached, cache_key='ids')
+        self.assertEqual(ElasticFilter.exists('user').cached(None), {'exists': {'field': 'user'}})
+
+    def test_uncacheable_filters_are_not_worth_caching(self):
+        tracker = ElasticFilterTracker()
+        for i in xrange(3):
+            tracker.track({'query': ElasticQuery.match_all(), 'filter': ElasticFilter.and_filter([ElasticFilter.exists('user'), ElasticFilter.term('tag', 'a')])})
+        worth = dict((entry['filter'].keys()[0], entry['worth_caching']) for entry in tracker.report())
+        self.assertEqual(worth, {'and': True, 'exists': False, 'term': True})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+'''
+@author Luke Campbell <LCampbell@ASAScience.com>
+@file test_loader
+@date 10/18/26 15:50
+@description Tests for splitting NDJSON files into bulk requests
+
+Usage:
+    python -m unittest discover tests
+'''
+import random
+import unittest
+
+from elasticpy.loader import ndjson_chunks, _records
+
+
+def _actions(chunks, header):
+    # The documents of every chunk, checking each one follows its own action line.
+    # Whitespace around a document is left in place by the fast path, json parsers skip it
+    documents = list()
+    for count, body in chunks:
+        lines = body.split('\n')
+        assert lines.pop() == ''
+        assert lines[0::2] == [header.rstrip('\n')] * count, body
+        documents.extend(line.strip() for line in lines[1::2])
+    return documents
+
+
+class NdjsonChunksTest(unittest.TestCase):
+
+    def test_whitespace_line_in_the_middle(self):
+        self.assertEqual(list(ndjson_chunks('{"a":1}\n   \n{"a":2}\n', 'H\n')), [(2, 'H\n{"a":1}\nH\n{"a":2}\n')])
+
+    def test_windows_line_endings(self):
+        self.assertEqual(list(ndjson_chunks('{"a":1}\r\n\t\r\n{"a":2}\r\n', 'H\n')), [(2, 'H\n{"a":1}\nH\n{"a":2}\n')])
+
+    def test_randomized_against_the_records(self):
+        rng = random.Random(20261018)
+        header = '{"index":{"_index":"twitter","_type":"tweet"}}\n'
+        for case in xrange(2000):
+            lines = [rng.choice(['{"a":%d}' % i, ' {"b": "x y"} ', '', '   ', '\t', '\r']) for i in xrange(rng.randint(0, 12))]
+            data = rng.choice(['\n', '\r\n']).join(lines) + rng.choice(['', '\n', ' \n'])
+            chunks = list(ndjson_chunks(data, header, rng.randint(1, 40)))
+            self.assertEqual(_actions(chunks, header), list(_records(data.replace('\r\n', '\n'))), 'case %d: %r' % (case, data))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+'''
+@author Luke Campbell <LCampbell@ASAScience.com>
+@file test_nodepool
+@date 10/18/26 11:10
+@description Tests for node selection, dead nodes and their resurrection
+
+Usage:
+    python -m unittest discover tests
+'''
+import unittest
+
+from elasticpy import nodepool
+from elasticpy.nodepool import ElasticNodePool, parse_node
+
+
+class FakeClock(object):
+    '''
+    Stands in for the time module in nodepool
+    '''
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+class NodePoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self._time = nodepool.time
+        nodepool.time = self.clock
+        self.probed = list()
+        self.answers = dict()
+
+    def tearDown(self):
+        nodepool.time = self._time
+
+    def probe(self, node):
+        self.probed.append(node)
+        return self.answers.get(node, True)
+
+    def test_parse_node(self):
+        self.assertEqual(parse_node('es1'), ('es1', '9200'))
+        self.assertEqual(parse_node('es1:9201'), ('es1', '9201'))
+        self.assertEqual(parse_node(('es1', 9202)), ('es1', 9202))
+
+    def test_rejects_bad_arguments(self):
+        self.assertRaises(ValueError, ElasticNodePool, ['es1'], selector='random')
+        self.assertRaises(ValueError, ElasticNodePool, [])
+
+    def test_round_robin(self):
+        pool = ElasticNodePool(['es1', 'es2', 'es3'])
+        self.assertEqual([pool.acquire()[0] for i in xrange(6)], ['es1', 'es2', 'es3', 'es1', 'es2', 'es3'])
+
+    def test_least_in_flight(self):
+        pool = ElasticNodePool(['es1', 'es2'], selector='least_in_flight')
+        first = pool.acquire()
+        second = pool.acquire()
+        self.assertNotEqual(first, second)
+        pool.release(first)
+        self.assertEqual(pool.acquire(), first)
+
+    def test_dead_node_is_skipped(self):
+        pool = ElasticNodePool(['es1', 'es2'], dead_timeout=60)
+        pool.mark_dead(('es1', '9200'))
+        self.assertEqual(set(pool.acquire() for i in xrange(4)), set([('es2', '9200')]))
+        self.assertEqual(pool.stats()['dead'], {('es1', '9200'): 1060.0})
+
+    def test_resurrected_after_timeout_when_probe_answers(self):
+        node = ('es1', '9200')
+        pool = ElasticNodePool(['es1', 'es2'], dead_timeout=60, probe=self.probe)
+        pool.mark_dead(node)
+        self.clock.now += 59
+        pool.acquire()
+        self.assertEqual(self.probed, [])
+        self.clock.now += 1
+        pool.acquire()
+        self.assertEqual(self.probed, [node])
+        self.assertTrue(node in pool.live)
+        self.assertEqual(pool.dead, {})
+
+    def test_failed_probe_doubles_the_timeout_up_to_the_maximum(self):
+        node = ('es1', '9200')
+        self.answers[node] = False
+        pool = ElasticNodePool(['es1', 'es2'], dead_timeout=60, max_dead_timeout=200, probe=self.probe)
+        pool.mark_dead(node)
+        timeouts = list()
+        for i in xrange(4):
+            self.clock.now = pool.dead[node][0]
+            pool.acquire()
+            timeouts.append(pool.dead[node][0] - self.clock.now)
+        self.assertEqual(timeouts, [120, 200, 200, 200])
+        self.assertEqual(len(self.probed), 4)
+        self.assertFalse(node in pool.live)
+
+    def test_without_probe_the_node_comes_back_untested(self):
+        node = ('es1', '9200')
+        pool = ElasticNodePool(['es1', 'es2'], dead_timeout=60)
+        pool.mark_dead(node)
+        self.clock.now += 60
+        pool.resurrect()
+        self.assertTrue(node in pool.live)
+
+    def test_every_node_dead_tries_the_closest_one(self):
+        pool = ElasticNodePool(['es1', 'es2'], dead_timeout=60, probe=self.probe)
+        pool.mark_dead(('es1', '9200'))
+        self.clock.now += 10
+        pool.mark_dead(('es2', '9200'))
+        self.assertEqual(pool.acquire(), ('es1', '9200'))
+        self.assertEqual(self.probed, [('es1', '9200')])
+
+    def test_every_node_dead_and_unreachable(self):
+        pool = ElasticNodePool(['es1'], dead_timeout=60, probe=self.probe)
+        self.answers[('es1', '9200')] = False
+        pool.mark_dead(('es1', '9200'))
+        self.assertEqual(pool.acquire(), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+'''
+@author Luke Campbell <LCampbell@ASAScience.com>
+@file test_optimize
+@date 10/18/26 10:45
+@description Tests that the query and filter optimizer keeps the documents matched
+
+Usage:
+    python -m unittest discover tests
+'''
+import random
+import unittest
+import itertools
+
+from elasticpy import ElasticQuery, ElasticFilter
+from elasticpy.optimize import optimize_query, optimize_filter
+
+
+# Every combination of two single valued fields, a missing field is None
+_values = ['a', 'b', 'c']
+documents = [dict((field, value) for field, value in (('tag', tag), ('user', user)) if value is not None)
+             for tag, user in itertools.product(_values + [None], repeat=2)]
+
+
+def _list(value):
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def _field(body):
+    # The field of a term or terms body, options start with an underscore or are known names
+    return [key for key in body if not key.startswith('_') and key not in ('minimum_match', 'minimum_should_match', 'execution', 'boost')][0]
+
+
+def query_matches(query, doc):
+    '''
+    Reference semantics of the queries the optimizer rewrites, on a single document
+    '''
+    name, body = query.items()[0]
+    if name == 'match_all':
+        return True
+    if name == 'term':
+        field = _field(body)
+        value = body[field]['value'] if isinstance(body[field], dict) else body[field]
+        return doc.get(field) == value
+    if name == 'terms':
+        field = _field(body)
+        minimum = body.get('minimum_match', body.get('minimum_should_match', 1))
+        return sum(1 for value in body[field] if doc.get(field) == value) >= minimum
+    if name == 'bool':
+        must, should, must_not = _list(body.get('must')), _list(body.get('should')), _list(body.get('must_not'))
+        if not all(query_matches(q, doc) for q in must) or any(query_matches(q, doc) for q in must_not):
+            return False
+        matched = sum(1 for q in should if query_matches(q, doc))
+        minimum = body.get('minimum_number_should_match')
+        if minimum is not None:
+            return matched >= minimum
+        return matched >= 1 if should and not must else True
+    if name == 'constant_score':
+        return filter_matches(body['filter'], doc)
+    if name == 'filtered':
+        return query_matches(body.get('query', {'match_all': {}}), doc) and filter_matches(body['filter'], doc)
+    raise ValueError('No reference semantics for %s' % name)
+
+
+def filter_matches(efilter, doc):
+    name, body = efilter.items()[0]
+    if name == 'term':
+        field = _field(body)
+        return doc.get(field) == body[field]
+    if name == 'terms':
+        field = _field(body)
+        return doc.get(field) in body[field]
+    if name == 'exists':
+        return body['field'] in doc
+    if name in ('and', 'or'):
+        filters = body['filters'] if isinstance(body, dict) else body
+        test = all if name == 'and' else any
+        return test(filter_matches(f, doc) for f in filters)
+    if name == 'not':
+        return not filter_matches(body['filter'] if isinstance(body, dict) and 'filter' in body else body, doc)
+    if name == 'bool':
+        must, should, must_not = _list(body.get('must')), _list(body.get('should')), _list(body.get('must_not'))
+        return (all(filter_matches(f, doc) for f in must) and not any(filter_matches(f, doc) for f in must_not)
+                and (not should or any(filter_matches(f, doc) for f in should)))
+    if name == 'query':
+        return query_matches(body, doc)
+    if name == 'fquery':
+        return query_matches(body['query'], doc)
+    raise ValueError('No reference semantics for %s' % name)
+
+
+def matched(test, tree):
+    return [i for i, doc in enumerate(documents) if test(tree, doc)]
+
+
+def random_filter(rng, depth=0):
+    kind = rng.randint(0, 8 if depth < 3 else 2)
+    field = rng.choice(['tag', 'user'])
+    if kind == 0:
+        return ElasticFilter.term(field, rng.choice(_values), cache=rng.choice([None, None, True, False]))
+    if kind == 1:
+        return {'terms': {field: rng.sample(_values, rng.randint(1, 3))}}
+    if kind == 2:
+        return ElasticFilter.exists(field)
+    if kind in (3, 4):
+        filters = [random_filter(rng, depth + 1) for i in xrange(rng.randint(1, 3))]
+        if rng.random() < 0.3:
+            filters.append(filters[0])
+        builder = ElasticFilter.and_filter if kind == 3 else ElasticFilter.or_filter
+        return builder(filters, cache=rng.choice([None, True]))
+    if kind == 5:
+        return ElasticFilter.not_filter(random_filter(rng, depth + 1), cache=rng.choice([None, True]))
+    if kind == 6:
+        return {'bool': dict((occur, [random_filter(rng, depth + 1) for i in xrange(rng.randint(1, 2))])
+                             for occur in rng.sample(['must', 'should', 'must_not'], rng.randint(1, 3)))}
+    if kind == 7:
+        return {'query': random_query(rng, depth + 1)}
+    return ElasticFilter.query(random_query(rng, depth + 1), cache=True)
+
+
+def random_query(rng, depth=0):
+    kind = rng.randint(0, 5 if depth < 3 else 1)
+    if kind == 0:
+        return ElasticQuery.term(**{rng.choice(['tag', 'user']): rng.choice(_values)})
+    if kind == 1:
+        return ElasticQuery.match_all()
+    if kind in (2, 3):
+        body = dict()
+        for occur in rng.sample(['must', 'should', 'must_not'], rng.randint(1, 3)):
+            clauses = [random_query(rng, depth + 1) for i in xrange(rng.randint(1, 3))]
+            if rng.random() < 0.3:
+                clauses.append(clauses[0])
+            body[occur] = clauses
+        if 'should' in body and rng.random() < 0.3:
+            body['minimum_number_should_match'] = rng.randint(1, 2)
+        return {'bool': body}
+    if kind == 4:
+        return {'constant_score': {'filter': random_filter(rng, depth + 1)}}
+    return {'filtered': {'query': random_query(rng, depth + 1), 'filter': random_filter(rng, depth + 1)}}
+
+
+class OptimizeQueryTest(unittest.TestCase):
+
+    def test_should_terms_are_merged(self):
+        query = ElasticQuery.bool(should=[ElasticQuery.term(tag='blue'), ElasticQuery.term(tag='pill')])
+        self.assertEqual(optimize_query(query), {'terms': {'tag': ['blue', 'pill'], 'minimum_match': 1}})
+
+    def test_nested_bools_are_flattened_and_deduplicated(self):
+        term = ElasticQuery.term(user='kimchy')
+        query = ElasticQuery.bool(must=[term, ElasticQuery.bool(must=[term, ElasticQuery.term(tag='a')])])
+        self.assertEqual(optimize_query(query), {'bool': {'must': [{'term': {'user': 'kimchy'}}, {'term': {'tag': 'a'}}]}})
+
+    def test_constant_score_moves_into_a_filter(self):
+        query = ElasticQuery.bool(must=[ElasticQuery.term(user='kimchy'), {'constant_score': {'filter': ElasticFilter.exists('tag')}}])
+        self.assertEqual(optimize_query(query), {'filtered': {'query': {'term': {'user': 'kimchy'}}, 'filter': {'exists': {'field': 'tag'}}}})
+
+    def test_should_stays_required_without_must(self):
+        query = {'bool': {'must': [{'constant_score': {'filter': ElasticFilter.exists('tag')}}], 'should': [ElasticQuery.term(user='a')]}}
+        optimized = optimize_query(query)
+        self.assertEqual(matched(query_matches, optimized), matched(query_matches, query))
+
+    def test_should_stays_optional_after_flattening(self):
+        # The nested bool only has must_not, once flattened the parent has no must clause left
+        query = {'bool': {'must': [{'bool': {'must_not': [ElasticQuery.term(tag='a')]}}], 'should': [ElasticQuery.term(user='b')]}}
+        optimized = optimize_query(query)
+        self.assertEqual(matched(query_matches, optimized), matched(query_matches, query))
+
+    def test_minimum_should_match_is_kept(self):
+        query = {'bool': {'should': [ElasticQuery.term(tag='a'), ElasticQuery.term(user='a')], 'minimum_number_should_match': 2}}
+        self.assertEqual(optimize_query(query), query)
+
+    def test_randomized_queries_match_the_same_documents(self):
+        rng = random.Random(20261018)
+        for case in xrange(2000):
+            query = random_query(rng)
+            optimized = optimize_query(query)
+            self.assertEqual(matched(query_matches, optimized), matched(query_matches, query), 'case %d: %r -> %r' % (case, query, optimized))
+
+
+class OptimizeFilterTest(unittest.TestCase):
+
+    def test_double_negation(self):
+        efilter = ElasticFilter.not_filter(ElasticFilter.not_filter(ElasticFilter.exists('tag')))
+        self.assertEqual(optimize_filter(efilter), {'exists': {'field': 'tag'}})
+
+    def test_cached_negation_is_kept(self):
+        efilter = ElasticFilter.not_filter(ElasticFilter.not_filter(ElasticFilter.exists('tag'), cache=True))
+        self.assertEqual(optimize_filter(efilter), efilter)
+
+    def test_or_terms_are_merged(self):
+        efilter = ElasticFilter.or_filter([ElasticFilter.term('tag', 'a'), ElasticFilter.term('tag', 'b'), ElasticFilter.exists('user')])
+        self.assertEqual(optimize_filter(efilter), {'or': [{'terms': {'tag': ['a', 'b']}}, {'exists': {'field': 'user'}}]})
+
+    def test_nested_and_is_flattened(self):
+        a, b, c = ElasticFilter.term('tag', 'a'), ElasticFilter.term('user', 'b'), ElasticFilter.exists('tag')
+        efilter = ElasticFilter.and_filter([a, ElasticFilter.and_filter([b, c]), a])
+        self.assertEqual(optimize_filter(efilter), {'and': [a, b, c]})
+
+    def test_randomized_filters_match_the_same_documents(self):
+        rng = random.Random(20261019)
+        for case in xrange(2000):
+            efilter = random_filter(rng)
+            optimized = optimize_filter(efilter)
+            self.assertEqual(matched(filter_matches, optimized), matched(filter_matches, efilter), 'case %d: %r -> %r' % (case, efilter, optimized))
+
+
+if __name__ == '__main__':
+    unittest.main()
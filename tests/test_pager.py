@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+'''
+@author Luke Campbell <LCampbell@ASAScience.com>
+@file test_pager
+@date 10/18/26 14:40
+@description Tests for keyset pagination filters and cursors
+
+Usage:
+    python -m unittest discover tests
+'''
+import unittest
+
+from elasticpy import ElasticSearch, ElasticQuery
+from elasticpy.codec import get_codec
+from elasticpy.pager import keyset_filter, encode_cursor, decode_cursor
+
+
+def _after(field, value, descending):
+    if descending:
+        return {'range': {field: {'to': value, 'include_upper': False}}}
+    return {'range': {field: {'from': value, 'include_lower': False}}}
+
+
+class KeysetFilterTest(unittest.TestCase):
+
+    def test_single_key(self):
+        self.assertEqual(keyset_filter([('date', False)], [5]), _after('date', 5, False))
+        self.assertEqual(keyset_filter([('date', True)], [5]), _after('date', 5, True))
+
+    def test_later_keys_only_break_ties(self):
+        efilter = keyset_filter([('date', True), ('id', False)], [5, 'a'])
+        self.assertEqual(efilter, {'or': [
+            _after('date', 5, True),
+            {'and': [{'term': {'date': 5}}, _after('id', 'a', False)]}
+        ]})
+
+
+class CursorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.codec = get_codec('json')
+        self.keys = [('date', True), ('id', False)]
+
+    def test_round_trip(self):
+        token = encode_cursor(self.keys, [1350000000000, u'tweet-\xe9'], self.codec)
+        self.assertFalse('=' in token)
+        self.assertEqual(decode_cursor(self.keys, token, self.codec), [1350000000000, u'tweet-\xe9'])
+
+    def test_cursor_of_another_sort(self):
+        token = encode_cursor(self.keys, [1, 'a'], self.codec)
+        self.assertRaises(ValueError, decode_cursor, [('user', True), ('id', False)], token, self.codec)
+
+    def test_malformed_cursor(self):
+        self.assertRaises(ValueError, decode_cursor, self.keys, 'not a cursor', self.codec)
+
+
+class PagerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sent = list()
+        self.pages = list()
+
+    def post_search(self, url, index, content):
+        self.sent.append(content)
+        return self.pages.pop(0)
+
+    def pager(self, search):
+        search._post_search = self.post_search
+        return search.pager('twitter', 'tweet', ElasticQuery.match_all(), 'id')
+
+    def test_sorted_with_a_single_dict(self):
+        pager = self.pager(ElasticSearch().sorted({'date': {'order': 'desc'}}))
+        self.assertEqual(pager.keys, [('date', True), ('id', False)])
+        self.assertEqual(pager.sort, [{'date': {'order': 'desc'}}, {'id': {'order': 'asc'}}])
+
+    def test_sort_is_not_modified(self):
+        search = ElasticSearch().sort(date='desc')
+        self.pager(search)
+        self.assertEqual(search.params['sort'], [{'date': 'desc'}])
+
+    def test_score_can_not_be_paged(self):
+        self.assertRaises(ValueError, self.pager, ElasticSearch().sort('_score'))
+
+    def test_pages_follow_the_cursor(self):
+        pager = self.pager(ElasticSearch().size(2).sorted({'date': {'order': 'desc'}}))
+        self.pages = [
+            {'hits': {'hits': [{'_id': '1', 'sort': [9, 'a']}, {'_id': '2', 'sort': [7, 'b']}]}},
+            {'hits': {'hits': [{'_id': '3', 'sort': [7, 'c']}]}}
+        ]
+        response, cursor = pager.page()
+        self.assertEqual(self.sent[0]['query'], ElasticQuery.match_all())
+        self.assertEqual(self.sent[0]['sort'], pager.sort)
+        response, cursor = pager.page(cursor)
+        self.assertEqual(cursor, None)
+        self.assertEqual(response['hits']['hits'][0]['_id'], '3')
+        self.assertEqual(self.sent[1]['query'], {'filtered': {
+            'query': ElasticQuery.match_all(),
+            'filter': keyset_filter([('date', True), ('id', False)], [7, 'b'])
+        }})
+
+
+if __name__ == '__main__':
+    unittest.main()
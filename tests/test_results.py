@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+'''
+@author Luke Campbell <LCampbell@ASAScience.com>
+@file test_results
+@date 10/18/26 10:20
+@description Tests for splitting the hit sources out of search responses
+
+Usage:
+    python -m unittest discover tests
+'''
+import json
+import random
+import unittest
+
+from elasticpy.results import split_sources, ElasticResults
+from elasticpy.codec import get_codec
+
+
+# Characters that trip up a brace counter or a naive string scanner
+_tricky = ['{', '}', '"', '\\', '\\"', '\\\\', '"_source":', '{"_source":{', '\n', ' ', 'a', u'\xe9', u'\u2603', '}}', '{{', ',']
+
+
+def _string(rng):
+    return u''.join(rng.choice(_tricky) for i in xrange(rng.randint(0, 8)))
+
+
+def _value(rng, depth=0):
+    kind = rng.randint(0, 6 if depth < 3 else 3)
+    if kind == 0:
+        return _string(rng)
+    if kind == 1:
+        return rng.randint(-1000, 1000)
+    if kind == 2:
+        return rng.choice([True, False, None, 1.5])
+    if kind == 3:
+        return _string(rng)
+    if kind == 4:
+        return [_value(rng, depth + 1) for i in xrange(rng.randint(0, 3))]
+    keys = [_string(rng) for i in xrange(rng.randint(0, 4))]
+    if rng.random() < 0.2:
+        keys.append('_source')
+    return dict((key, _value(rng, depth + 1)) for key in keys)
+
+
+def _response(rng):
+    hits = list()
+    for i in xrange(rng.randint(0, 5)):
+        hit = {'_index': 'twitter', '_type': 'tweet', '_id': _string(rng), '_score': rng.random()}
+        if rng.random() < 0.9:
+            source = _value(rng, 1)
+            hit['_source'] = source if isinstance(source, dict) else {'value': source}
+        if rng.random() < 0.3:
+            hit['sort'] = [_string(rng), rng.randint(0, 10)]
+        hits.append(hit)
+    return {'took': rng.randint(0, 50), 'timed_out': False, 'hits': {'total': len(hits), 'max_score': 1.0, 'hits': hits}}
+
+
+def _encode(rng, response):
+    style = rng.randint(0, 2)
+    if style == 0:
+        return json.dumps(response)
+    if style == 1:
+        return json.dumps(response, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    return json.dumps(response, indent=rng.choice([1, 2]))
+
+
+def _rejoin(skeleton, sources):
+    # Puts the decoded sources back where split_sources left their positions
+    decoded = json.loads(skeleton)
+    for hit in decoded['hits']['hits']:
+        if '_source' in hit:
+            hit['_source'] = json.loads(sources[hit['_source']])
+    return decoded
+
+
+class SplitSourcesTest(unittest.TestCase):
+
+    def test_example(self):
+        skeleton, sources = split_sources('{"hits":{"hits":[{"_id":"1","_source":{"user":"kimchy"}}]}}')
+        self.assertEqual(skeleton, '{"hits":{"hits":[{"_id":"1","_source":0}]}}')
+        self.assertEqual(sources, ['{"user":"kimchy"}'])
+
+    def test_braces_and_quotes_in_strings(self):
+        response = {'hits': {'hits': [
+            {'_id': '1', '_source': {'message': 'a } brace', 'nested': {'quote': 'say \\"}\\" {'}}},
+            {'_id': '2', '_source': {'message': '"_source":{"fake": 1}'}}
+        ]}}
+        text = json.dumps(response)
+        skeleton, sources = split_sources(text)
+        self.assertEqual(len(sources), 2)
+        self.assertEqual(_rejoin(skeleton, sources), response)
+
+    def test_marker_inside_string_is_not_cut(self):
+        text = json.dumps({'hits': {'hits': [{'_id': '"_source":{"x":1}'}]}})
+        self.assertEqual(split_sources(text), (text, []))
+
+    def test_truncated_response_is_left_whole(self):
+        text = '{"hits":{"hits":[{"_id":"1","_source":{"user":"kim'
+        self.assertEqual(split_sources(text), (text, []))
+
+    def test_randomized_against_full_decoding(self):
+        rng = random.Random(20261018)
+        for case in xrange(3000):
+            response = _response(rng)
+            text = _encode(rng, response)
+            skeleton, sources = split_sources(text)
+            self.assertEqual(_rejoin(skeleton, sources), json.loads(text), 'case %d: %r' % (case, text))
+
+
+class ElasticResultsTest(unittest.TestCase):
+
+    def test_hits_decode_their_source_when_read(self):
+        text = json.dumps({'took': 3, 'timed_out': False, 'hits': {'total': 2, 'max_score': 1.0, 'hits': [
+            {'_index': 'twitter', '_type': 'tweet', '_id': '1', '_score': 1.0, '_source': {'user': 'kimchy'}},
+            {'_index': 'twitter', '_type': 'tweet', '_id': '2', '_score': 0.5}
+        ]}})
+        results = ElasticResults(text, get_codec('json'))
+        self.assertEqual((results.total, results.took, len(results)), (2, 3, 2))
+        first, second = results
+        self.assertEqual(first.raw_source, '{"user": "kimchy"}')
+        self.assertEqual(first.source, {'user': 'kimchy'})
+        self.assertEqual(first['_id'], '1')
+        self.assertEqual(second.source, None)
+        self.assertEqual(second.get('_source', 'missing'), 'missing')
+        self.assertRaises(KeyError, lambda: second['_source'])
+
+    def test_empty_response(self):
+        results = ElasticResults('', get_codec('json'))
+        self.assertEqual(len(results), 0)
+        self.assertEqual(results.response, {'error': 'Empty response'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+'''
+@author Luke Campbell <LCampbell@ASAScience.com>
+@file test_workers
+@date 10/18/26 16:20
+@description Tests for the bounded worker thread pool
+
+Usage:
+    python -m unittest discover tests
+'''
+import time
+import threading
+import unittest
+
+from elasticpy.workers import imap_bounded
+
+
+def collect(outcomes, timeout=10):
+    '''
+    Consumes outcomes on another thread so a hung pool fails the test instead of blocking the run
+    '''
+    collected = list()
+    thread = threading.Thread(target=lambda: collected.extend(outcomes))
+    thread.daemon = True
+    thread.start()
+    thread.join(timeout)
+    if thread.is_alive():
+        raise AssertionError('imap_bounded did not finish within %s seconds' % timeout)
+    return collected
+
+
+class ImapBoundedTest(unittest.TestCase):
+
+    def test_every_item_is_applied(self):
+        outcomes = collect(imap_bounded(lambda x: x * x, xrange(50), thread_count=4, queue_size=2))
+        self.assertEqual(sorted(outcomes), [(True, x, x * x) for x in xrange(50)])
+
+    def test_func_raising(self):
+        def func(x):
+            if x % 3 == 0:
+                raise ValueError(x)
+            return x
+        outcomes = sorted(collect(imap_bounded(func, xrange(10), thread_count=3)), key=lambda outcome: outcome[1])
+        self.assertEqual([(ok, item) for ok, item, result in outcomes], [(x % 3 != 0, x) for x in xrange(10)])
+        self.assertEqual([str(result) for ok, item, result in outcomes if not ok], ['0', '3', '6', '9'])
+
+    def test_initializer_state_per_worker(self):
+        states = list()
+        lock = threading.Lock()
+
+        def initializer():
+            with lock:
+                states.append(object())
+                return states[-1]
+        outcomes = collect(imap_bounded(lambda state, x: state, xrange(40), thread_count=4, initializer=initializer))
+        self.assertEqual(len(states), 4)
+        self.assertTrue(set(result for ok, item, result in outcomes) <= set(states))
+
+    def test_initializer_failure_reports_the_items(self):
+        error = IOError('no connection')
+
+        def initializer():
+            raise error
+        outcomes = collect(imap_bounded(lambda state, x: x, xrange(20), thread_count=2, initializer=initializer))
+        self.assertEqual(sorted(outcomes), [(False, x, error) for x in xrange(20)])
+
+    def test_one_initializer_failing(self):
+        calls = list()
+        lock = threading.Lock()
+        error = IOError('no connection')
+
+        def initializer():
+            with lock:
+                calls.append(None)
+                if len(calls) == 1:
+                    raise error
+        outcomes = collect(imap_bounded(lambda state, x: x, xrange(30), thread_count=3, initializer=initializer))
+        self.assertEqual(sorted(item for ok, item, result in outcomes), range(30))
+        self.assertTrue(all(ok or result is error for ok, item, result in outcomes))
+
+    def test_close_does_not_run_the_queued_items(self):
+        called = list()
+
+        def func(x):
+            called.append(x)
+            time.sleep(0.05)
+            return x
+        outcomes = imap_bounded(func, xrange(100), thread_count=1, queue_size=20)
+        outcomes.next()
+        started = time.time()
+        outcomes.close()
+        self.assertTrue(time.time() - started < 0.5)
+        self.assertTrue(len(called) <= 3, called)
+
+    def test_read_ahead_is_bounded(self):
+        pulled = [0]
+
+        def source():
+            for x in xrange(100):
+                pulled[0] += 1
+                yield x
+        consumed = 0
+        ahead = list()
+        for ok, item, result in imap_bounded(lambda x: x, source(), thread_count=3, queue_size=2):
+            ahead.append(pulled[0] - consumed)
+            consumed += 1
+        self.assertEqual(consumed, 100)
+        self.assertEqual(max(ahead), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()